@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片嗅探工具的离线性能基准
+启动本地HTTP服务器生成合成图库页面，测量嗅探、验证和下载的吞吐量，
+结果保存为JSON基线，便于在不同版本之间比较
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from PIL import Image
+
+from selenium_sniffer import (
+    SeleniumImageSniffer, BatchDownloader, DiskCache, SniffMetrics, setup_logging,
+)
+
+
+class GalleryFixture:
+    """合成图库：页面结构和每张图片的故障注入方式
+    
+    图片按序号轮流使用 <img src>、data-src、data-original、srcset 和CSS背景，
+    并按固定规则注入故障：不返回Content-Length、慢响应、403和首次请求429。
+    页面中还混有小图标，用来检验大小过滤。相同的参数总是生成相同的图库。
+    """
+    
+    SOURCES = ('src', 'data-src', 'data-original', 'srcset', 'background')
+    
+    def __init__(self, images=100, slow_ms=200, faults=True, seed=0):
+        self.images = images
+        self.slow_ms = slow_ms
+        self.faults = faults
+        rng = random.Random(seed)
+        self.specs = []
+        for i in range(images):
+            fault = None
+            if faults:
+                if i % 10 == 3:
+                    fault = 'no-length'
+                elif i % 10 == 6:
+                    fault = 'slow'
+                elif i % 25 == 9:
+                    fault = '403'
+                elif i % 25 == 17:
+                    fault = '429'
+            self.specs.append({
+                'index': i,
+                'ext': 'png' if i % 4 == 1 else 'jpg',
+                'size': (rng.randint(400, 1600), rng.randint(300, 1200)),
+                'source': self.SOURCES[i % len(self.SOURCES)],
+                'fault': fault,
+            })
+        self._bodies = {}
+        self._lock = threading.Lock()
+    
+    def image_path(self, spec):
+        return f"/img/{spec['index']}.{spec['ext']}"
+    
+    def body(self, index):
+        """生成（并缓存）图片数据，颜色和噪点由序号决定"""
+        with self._lock:
+            data = self._bodies.get(index)
+        if data is not None:
+            return data
+        
+        spec = self.specs[index]
+        rng = random.Random(index)
+        image = Image.new('RGB', spec['size'], (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        # 加入噪点，避免被压缩成很小的文件
+        noise = Image.effect_noise(spec['size'], 64).convert('RGB')
+        image = Image.blend(image, noise, 0.3)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG' if spec['ext'] == 'png' else 'JPEG', quality=85)
+        data = buffer.getvalue()
+        
+        with self._lock:
+            self._bodies[index] = data
+        return data
+    
+    def icon(self):
+        """小于默认最小大小的图标"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (16, 16), (200, 0, 0)).save(buffer, 'PNG')
+        return buffer.getvalue()
+    
+    def page(self, base_url):
+        """生成图库页面HTML"""
+        parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>gallery</title>',
+                 '<style>.bg{width:400px;height:300px;background-size:cover}</style></head><body>']
+        for spec in self.specs:
+            url = base_url + self.image_path(spec)
+            source = spec['source']
+            if spec['index'] % 7 == 0:
+                parts.append(f'<img src="{base_url}/img/icon{spec["index"]}.png" width="16" height="16">')
+            if source == 'src':
+                parts.append(f'<img src="{url}" width="400">')
+            elif source == 'data-src':
+                parts.append(f'<img class="lazy" data-src="{url}" width="400" height="300">')
+            elif source == 'data-original':
+                parts.append(f'<img class="lazy" data-original="{url}" width="400" height="300">')
+            elif source == 'srcset':
+                parts.append(f'<img srcset="{url} 2x" width="400">')
+            else:
+                parts.append(f'<div class="bg" style="background-image:url(\'{url}\')"></div>')
+        # 模拟常见的懒加载脚本：进入视口时把data-*地址换到src
+        parts.append('''<script>
+        var io = new IntersectionObserver(function (entries) {
+            entries.forEach(function (e) {
+                if (!e.isIntersecting) return;
+                var img = e.target, url = img.dataset.src || img.dataset.original;
+                if (url) { img.src = url; }
+                io.unobserve(img);
+            });
+        });
+        document.querySelectorAll('img.lazy').forEach(function (img) { io.observe(img); });
+        </script></body></html>''')
+        return ''.join(parts)
+    
+    def expected_urls(self, base_url):
+        """页面中所有候选图片的URL（按页面顺序），供假驱动模式使用"""
+        urls = []
+        for spec in self.specs:
+            if spec['index'] % 7 == 0:
+                urls.append(f"{base_url}/img/icon{spec['index']}.png")
+            urls.append(base_url + self.image_path(spec))
+        return urls
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """客户端读取到所需字节后主动断开（如Range探测）是正常情况，不打印异常"""
+    
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FixtureServer:
+    """在后台线程中运行的本地HTTP服务器"""
+    
+    def __init__(self, fixture, host='127.0.0.1', port=0):
+        self.fixture = fixture
+        self.requests = 0
+        self._rate_limited = set()
+        self._lock = threading.Lock()
+        self.httpd = _QuietHTTPServer((host, port), self._handler_class())
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def _first_request(self, path):
+        """同一路径是否第一次请求（用于只在首次返回429）"""
+        with self._lock:
+            if path in self._rate_limited:
+                return False
+            self._rate_limited.add(path)
+            return True
+    
+    def _handler_class(self):
+        server = self
+        fixture = self.fixture
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_HEAD(self):
+                self._respond(head=True)
+            
+            def do_GET(self):
+                self._respond(head=False)
+            
+            def _send(self, status, content_type, body, head, length=True, extra=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                for name, value in (extra or {}).items():
+                    self.send_header(name, value)
+                if length:
+                    self.send_header('Content-Length', str(len(body)))
+                else:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                if head:
+                    return
+                if length:
+                    self.wfile.write(body)
+                    return
+                for start in range(0, len(body), 16384):
+                    chunk = body[start:start + 16384]
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+            
+            def _respond(self, head):
+                with server._lock:
+                    server.requests += 1
+                path = urlparse(self.path).path
+                
+                if path in ('/', '/gallery.html'):
+                    body = fixture.page(server.base_url).encode('utf-8')
+                    return self._send(200, 'text/html; charset=utf-8', body, head)
+                
+                if path.startswith('/img/icon'):
+                    return self._send(200, 'image/png', fixture.icon(), head)
+                
+                if not path.startswith('/img/'):
+                    return self._send(404, 'text/plain', b'not found', head)
+                
+                try:
+                    index = int(os.path.splitext(os.path.basename(path))[0])
+                    spec = fixture.specs[index]
+                except (ValueError, IndexError):
+                    return self._send(404, 'text/plain', b'not found', head)
+                
+                fault = spec['fault']
+                if fault == '403':
+                    return self._send(403, 'text/plain', b'forbidden', head)
+                if fault == '429' and server._first_request(path):
+                    return self._send(429, 'text/plain', b'too many requests', head, extra={'Retry-After': '1'})
+                if fault == 'slow':
+                    time.sleep(fixture.slow_ms / 1000)
+                
+                body = fixture.body(index)
+                content_type = 'image/png' if spec['ext'] == 'png' else 'image/jpeg'
+                
+                # 支持单段Range请求（不返回长度的图片不支持Range，和很多动态图片服务一致）
+                range_header = self.headers.get('Range', '')
+                if range_header.startswith('bytes=') and fault != 'no-length':
+                    start, _, end = range_header[6:].partition('-')
+                    start = int(start or 0)
+                    end = min(int(end) if end else len(body) - 1, len(body) - 1)
+                    if start >= len(body):
+                        return self._send(416, 'text/plain', b'', head,
+                                          extra={'Content-Range': f'bytes */{len(body)}'})
+                    return self._send(206, content_type, body[start:end + 1], head,
+                                      extra={'Content-Range': f'bytes {start}-{end}/{len(body)}',
+                                             'Accept-Ranges': 'bytes'})
+                
+                return self._send(200, content_type, body, head, length=fault != 'no-length',
+                                  extra={'Accept-Ranges': 'bytes'} if fault != 'no-length' else None)
+        
+        return Handler
+
+
+class FakeDriver:
+    """不启动浏览器的假驱动，只提供验证和下载阶段用到的接口"""
+    
+    def __init__(self, page_url):
+        self.page_url = page_url
+    
+    def execute_script(self, script, *args):
+        return ['Mozilla/5.0 (benchmark)', self.page_url, '']
+    
+    def get_cookies(self):
+        return []
+    
+    def quit(self):
+        pass
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else 0.0
+
+
+def run_once(mode, fixture, server, args, work_dir):
+    """运行一轮基准，返回本轮的测量结果"""
+    metrics = SniffMetrics()
+    cache = DiskCache(cache_dir=os.path.join(work_dir, 'cache')) if args.cache else None
+    sniffer = SeleniumImageSniffer(max_workers=args.workers, per_host_limit=args.per_host,
+                                   cache=cache, metrics=metrics,
+                                   fetch_mode='static' if mode == 'static' else 'browser',
+                                   lean_profile=not args.full_load)
+    page_url = server.base_url + '/gallery.html'
+    
+    started = time.perf_counter()
+    try:
+        if mode == 'e2e':
+            if not sniffer.create_driver(headless=True):
+                raise RuntimeError("无法启动浏览器，端到端模式需要本地Chrome")
+            images = sniffer.extract_images_from_page(page_url, args.min_size)
+        elif mode == 'static':
+            images = sniffer.extract_images_from_page(page_url, args.min_size)
+            if sniffer.last_error:
+                raise RuntimeError(sniffer.last_error)
+        else:
+            sniffer.driver = FakeDriver(page_url)
+            sniffer.refresh_context(force=True)
+            with metrics.phase('validate'):
+                images = sniffer.validate_images(fixture.expected_urls(server.base_url), args.min_size)
+            sniffer.driver = None
+        sniff_seconds = time.perf_counter() - started
+        
+        download_seconds = 0.0
+        downloaded = 0
+        if not args.no_download and images:
+            save_dir = os.path.join(work_dir, 'download')
+            download_started = time.perf_counter()
+            downloader = BatchDownloader(sniffer, max_workers=args.workers, per_host_limit=args.per_host,
+                                         backoff=args.backoff, resume=False)
+            results = downloader.download_all(images, save_dir)
+            download_seconds = time.perf_counter() - download_started
+            downloaded = sum(1 for result in results if result['file_path'])
+    finally:
+        sniffer.close()
+    
+    summary = metrics.summary()
+    download_bytes = summary['counters'].get('download.bytes', 0)
+    return {
+        'images_found': len(images),
+        'images_downloaded': downloaded,
+        'sniff_seconds': round(sniff_seconds, 3),
+        'download_seconds': round(download_seconds, 3),
+        'sniff_images_per_sec': _rate(len(images), sniff_seconds),
+        'download_images_per_sec': _rate(downloaded, download_seconds),
+        'download_bytes_per_sec': _rate(download_bytes, download_seconds),
+        'phases': summary['phases'],
+        'counters': summary['counters'],
+        'hosts': sniffer.host_stats(),
+    }
+
+
+# 比较基线时使用的指标：名称 -> 数值越大越好
+COMPARED_METRICS = {
+    'sniff_images_per_sec': True,
+    'download_images_per_sec': True,
+    'download_bytes_per_sec': True,
+    'sniff_seconds': False,
+    'download_seconds': False,
+}
+
+
+def aggregate(runs):
+    """多轮结果取中位数，阶段耗时取各轮总耗时的中位数"""
+    result = {name: round(statistics.median(run[name] for run in runs), 3) for name in COMPARED_METRICS}
+    result['images_found'] = runs[-1]['images_found']
+    result['images_downloaded'] = runs[-1]['images_downloaded']
+    
+    phase_names = sorted({name for run in runs for name in run['phases']})
+    result['phases'] = {
+        name: {
+            'count': runs[-1]['phases'].get(name, {}).get('count', 0),
+            'total': round(statistics.median(run['phases'].get(name, {}).get('total', 0.0) for run in runs), 4),
+            'max': round(max(run['phases'].get(name, {}).get('max', 0.0) for run in runs), 4),
+        }
+        for name in phase_names
+    }
+    result['counters'] = runs[-1]['counters']
+    result['hosts'] = runs[-1]['hosts']
+    return result
+
+
+def compare(current, baseline, tolerance):
+    """与基线比较，返回 (报告行列表, 是否有退化)"""
+    lines = []
+    regressed = False
+    for name, higher_is_better in COMPARED_METRICS.items():
+        old = baseline['results'].get(name)
+        new = current['results'].get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > tolerance:
+            flag = '  ✗ 退化'
+            regressed = True
+        elif -worse > tolerance:
+            flag = '  ✓ 提升'
+        lines.append(f"{name:26s} {old:>12} -> {new:>12} ({change:+.1%}){flag}")
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='图片嗅探工具的离线性能基准')
+    parser.add_argument('--mode', choices=('fake', 'static', 'e2e'), default='fake',
+                        help='fake：假驱动，只测验证和下载；static：不启动浏览器，直接解析HTML；'
+                             'e2e：本地无头Chrome端到端嗅探')
+    parser.add_argument('--images', type=int, default=100, help='图库中的图片数')
+    parser.add_argument('--slow-ms', type=int, default=200, help='慢响应图片的延迟（毫秒）')
+    parser.add_argument('--no-faults', action='store_true', help='不注入故障（缺少长度、慢响应、403、429）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复轮数，结果取中位数')
+    parser.add_argument('--workers', type=int, default=8, help='验证/下载线程数')
+    parser.add_argument('--per-host', type=int, default=4, help='单个主机的最大并发数')
+    parser.add_argument('--min-size', type=int, default=10, help='最小图片大小(KB)')
+    parser.add_argument('--backoff', type=float, default=1.0, help='下载重试的初始退避时间（秒）')
+    parser.add_argument('--cache', action='store_true', help='使用（每轮新建的）磁盘缓存')
+    parser.add_argument('--no-download', action='store_true', help='只测嗅探和验证')
+    parser.add_argument('--full-load', action='store_true', help='端到端模式下关闭精简加载（用于对比）')
+    parser.add_argument('--label', default='', help='写入结果的版本标签')
+    parser.add_argument('--save', metavar='FILE', help='把结果保存为JSON基线')
+    parser.add_argument('--compare', metavar='FILE', help='与已保存的JSON基线比较')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='比较时允许的相对波动（默认15%%）')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出嗅探器日志')
+    args = parser.parse_args(argv)
+    
+    setup_logging(logging.INFO if args.verbose else logging.WARNING)
+    
+    fixture = GalleryFixture(images=args.images, slow_ms=args.slow_ms, faults=not args.no_faults)
+    server = FixtureServer(fixture).start()
+    # 预先生成图片数据，不计入测量时间
+    for spec in fixture.specs:
+        fixture.body(spec['index'])
+    
+    runs = []
+    try:
+        for round_index in range(max(1, args.repeat)):
+            with tempfile.TemporaryDirectory(prefix='sniffer_bench_') as work_dir:
+                run = run_once(args.mode, fixture, server, args, work_dir)
+            runs.append(run)
+            print(f"[{round_index + 1}/{args.repeat}] 找到 {run['images_found']} 张, "
+                  f"嗅探 {run['sniff_seconds']}s ({run['sniff_images_per_sec']} 张/s), "
+                  f"下载 {run['download_seconds']}s ({run['download_bytes_per_sec'] / 1024 / 1024:.2f} MB/s)",
+                  file=sys.stderr)
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    finally:
+        server.stop()
+    
+    current = {
+        'label': args.label,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'mode': args.mode,
+            'images': args.images,
+            'slow_ms': args.slow_ms,
+            'faults': not args.no_faults,
+            'repeat': args.repeat,
+            'workers': args.workers,
+            'per_host': args.per_host,
+            'min_size': args.min_size,
+            'cache': args.cache,
+            'download': not args.no_download,
+            'lean': not args.full_load,
+        },
+        'results': aggregate(runs),
+    }
+    
+    print(json.dumps(current, ensure_ascii=False, indent=2))
+    
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"✅ 基线已保存到: {args.save}", file=sys.stderr)
+    
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != current['config']:
+            print("⚠️ 基线的配置与本次不同，比较结果仅供参考", file=sys.stderr)
+        lines, regressed = compare(current, baseline, args.tolerance)
+        print(f"与基线 {baseline.get('label') or args.compare} 比较:", file=sys.stderr)
+        for line in lines:
+            print(line, file=sys.stderr)
+        if regressed:
+            return 2
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,37 +8,1368 @@
 
 import os
 import re
+import base64
 import time
 import json
+import hashlib
+import shutil
+import struct
 import threading
+import queue
+from collections import deque, OrderedDict
+from email.utils import parsedate_to_datetime
+import logging
+from contextlib import contextmanager
+import argparse
+import multiprocessing
+from multiprocessing.util import Finalize
 from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException, SessionNotCreatedException
 from webdriver_manager.chrome import ChromeDriverManager
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
+from PIL import Image, ImageTk, ImageDraw
 import io
 
+try:
+    import psutil
+except ImportError:
+    # 可选依赖：没有psutil时驱动池只按访问页面数回收浏览器
+    psutil = None
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+IMAGE_ACCEPT = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+
+logger = logging.getLogger('image_sniffer')
+
+
+def setup_logging(level=logging.INFO):
+    """命令行、界面和批量工作进程共用的日志配置：输出到标准错误，只显示消息"""
+    logging.basicConfig(level=level, format='%(message)s')
+
+
+def parse_image_dimensions(data):
+    """从图片文件头解析像素尺寸，支持JPEG/PNG/GIF/WebP/BMP
+    
+    返回 (宽, 高)，数据不足或格式无法识别时返回None。
+    """
+    try:
+        if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+            return struct.unpack('>II', data[16:24])
+        
+        if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+            return struct.unpack('<HH', data[6:10])
+        
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+            chunk = data[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', data[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L':
+                b0, b1, b2, b3 = data[21:25]
+                width = 1 + (((b1 & 0x3F) << 8) | b0)
+                height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+                return width, height
+            if chunk == b'VP8X':
+                width = 1 + int.from_bytes(data[24:27], 'little')
+                height = 1 + int.from_bytes(data[27:30], 'little')
+                return width, height
+            return None
+        
+        if data[:2] == b'BM' and len(data) >= 26:
+            width, height = struct.unpack('<ii', data[18:26])
+            return width, abs(height)
+        
+        if data[:2] == b'\xff\xd8':
+            # 逐个跳过JPEG段，直到遇到SOF帧头
+            i = 2
+            while i + 9 < len(data):
+                if data[i] != 0xFF:
+                    i += 1
+                    continue
+                marker = data[i + 1]
+                if marker == 0xFF:
+                    i += 1
+                    continue
+                if marker in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                              0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                    height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                    return width, height
+                if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+                    i += 2
+                    continue
+                i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    except (struct.error, ValueError, IndexError):
+        pass
+    
+    return None
+
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+def resolve_chromedriver_path(refresh=False):
+    """解析ChromeDriver路径
+    
+    第一次调用时通过webdriver-manager查找，结果缓存在进程内和磁盘上，
+    之后的运行只要文件仍然存在就跳过webdriver-manager。refresh=True时忽略缓存重新查找
+    （Chrome自动更新后缓存的ChromeDriver版本不再匹配）。
+    """
+    global _chromedriver_path
+    
+    with _chromedriver_lock:
+        if not refresh and _chromedriver_path and os.path.exists(_chromedriver_path):
+            return _chromedriver_path
+        
+        cache_file = os.path.join(os.path.expanduser('~'), '.cache', 'image_sniffer', 'chromedriver.json')
+        if not refresh:
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    path = json.load(f).get('path')
+                if path and os.path.exists(path):
+                    _chromedriver_path = path
+                    return path
+            except (OSError, ValueError):
+                pass
+        
+        path = ChromeDriverManager().install()
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'path': path}, f)
+        except OSError as e:
+            logger.warning(f"保存ChromeDriver路径失败: {e}")
+        
+        _chromedriver_path = path
+        return path
+
+
+class DriverPool:
+    """预启动的浏览器驱动池
+    
+    取出时检查浏览器是否可用，归还时清理cookies和多余标签页；
+    访问页面数超过max_pages，或浏览器进程（含所有子进程）占用内存超过max_memory_mb
+    （需要psutil）的浏览器会被关闭重建。
+    """
+    
+    def __init__(self, factory, size=1, max_pages=50, max_memory_mb=1536):
+        # factory(key) 返回一个新的WebDriver，key为浏览器配置标识
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._idle = []
+        # id(driver) -> {'key': 配置标识, 'pages': 已访问页面数}
+        self._info = {}
+        self._lock = threading.Lock()
+    
+    def _launch(self, key):
+        driver = self.factory(key)
+        with self._lock:
+            self._info[id(driver)] = {'key': key, 'pages': 0}
+        return driver
+    
+    def warm(self, key, count=None):
+        """在后台线程中预先启动浏览器"""
+        def launch():
+            for _ in range(count or self.size):
+                with self._lock:
+                    if len(self._idle) >= self.size:
+                        return
+                try:
+                    driver = self._launch(key)
+                except Exception as e:
+                    logger.warning(f"预启动浏览器失败: {e}")
+                    return
+                with self._lock:
+                    self._idle.append(driver)
+        
+        threading.Thread(target=launch, daemon=True).start()
+    
+    def _healthy(self, driver):
+        try:
+            driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+    
+    def acquire(self, key):
+        """取出一个配置相同且可用的浏览器，没有时启动新的"""
+        while True:
+            with self._lock:
+                driver = next((d for d in self._idle if self._info[id(d)]['key'] == key), None)
+                if driver is None:
+                    break
+                self._idle.remove(driver)
+            if self._healthy(driver):
+                return driver
+            self._discard(driver)
+        
+        return self._launch(key)
+    
+    def note_page(self, driver):
+        """记录浏览器访问了一个页面"""
+        with self._lock:
+            info = self._info.get(id(driver))
+            if info:
+                info['pages'] += 1
+    
+    def _memory_mb(self, driver):
+        """ChromeDriver启动的Chrome进程树（浏览器、渲染、GPU等子进程）的物理内存总和，无法测量时为0"""
+        if psutil is None:
+            return 0
+        try:
+            root = psutil.Process(driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return 0
+        
+        used = 0
+        for process in processes:
+            try:
+                used += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return used / (1024 * 1024)
+    
+    def _reset(self, driver):
+        """清理浏览器状态：关闭多余标签页、清空cookies和存储"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        driver.get('about:blank')
+    
+    def release(self, driver):
+        """归还浏览器，需要回收或空闲数已满时直接关闭"""
+        with self._lock:
+            info = self._info.get(id(driver))
+        
+        if not info or info['pages'] >= self.max_pages or self._memory_mb(driver) > self.max_memory_mb:
+            self._discard(driver)
+            return
+        
+        try:
+            self._reset(driver)
+        except Exception as e:
+            logger.warning(f"重置浏览器状态失败: {e}")
+            self._discard(driver)
+            return
+        
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(driver)
+                return
+        self._discard(driver)
+    
+    def _discard(self, driver):
+        with self._lock:
+            self._info.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    
+    def shutdown(self):
+        """关闭池中所有空闲浏览器"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
+
+
+def perceptual_hash(file_path):
+    """计算图片的差值哈希（dHash，64位），返回 (哈希值, 像素面积)"""
+    with Image.open(file_path) as image:
+        width, height = image.size
+        # JPEG使用draft按缩小比例解码，避免完整解码大图
+        image.draft('L', (64, 64))
+        small = image.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+        pixels = list(small.getdata())
+    
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value, width * height
+
+
+class Deduplicator:
+    """下载去重
+    
+    下载时对数据流计算SHA-256，内容完全相同的图片只保留第一份；开启perceptual后
+    再用感知哈希比较，视觉上相同的图片只保留像素面积最大的版本。
+    已保留的文件被更大的版本替换时记录重定向，之前返回的路径可以用resolve()得到最终文件。
+    """
+    
+    def __init__(self, perceptual=False, threshold=4):
+        self.perceptual = perceptual
+        # 感知哈希的汉明距离不超过该值视为同一张图片
+        self.threshold = threshold
+        self._by_digest = {}
+        self._perceptual_entries = []
+        # 被替换删除的文件 -> 替换它的文件
+        self._redirects = {}
+        # 保留的文件 -> (大小, SHA-256)
+        self._kept = {}
+        self._lock = threading.Lock()
+        self.stats = {'unique': 0, 'exact_duplicates': 0, 'perceptual_duplicates': 0, 'bytes_saved': 0}
+    
+    def register(self, file_path, digest, size, on_replace=None):
+        """登记一个刚下载完成的文件，返回应保留的文件路径
+        
+        返回值与file_path不同时表示该文件是重复的，已被删除。新文件替换了之前保留的
+        相似文件时，旧文件被删除并调用 on_replace(旧文件路径, 新文件路径)。
+        """
+        with self._lock:
+            entry = self._by_digest.get(digest)
+            if entry:
+                self.stats['exact_duplicates'] += 1
+                self.stats['bytes_saved'] += size
+                duplicate_of = entry['path']
+            else:
+                duplicate_of = None
+        
+        if duplicate_of:
+            self._remove(file_path)
+            return duplicate_of
+        
+        entry = {'path': file_path, 'size': size, 'hash': None, 'area': 0}
+        
+        if self.perceptual:
+            try:
+                entry['hash'], entry['area'] = perceptual_hash(file_path)
+            except Exception:
+                # 无法解码的文件（如SVG）只做精确去重
+                pass
+        
+        with self._lock:
+            self._by_digest[digest] = entry
+            similar = None
+            if entry['hash'] is not None:
+                similar = next((e for e in self._perceptual_entries
+                                if bin(e['hash'] ^ entry['hash']).count('1') <= self.threshold), None)
+            
+            if similar is None:
+                if entry['hash'] is not None:
+                    self._perceptual_entries.append(entry)
+                self.stats['unique'] += 1
+                self._kept[file_path] = (size, digest)
+                return file_path
+            
+            self.stats['perceptual_duplicates'] += 1
+            if entry['area'] <= similar['area']:
+                # 新文件不比已有的大，丢弃新文件
+                self.stats['bytes_saved'] += size
+                entry['path'] = similar['path']
+                removed, kept = file_path, similar['path']
+                replaced = False
+            else:
+                # 新文件分辨率更高，替换已有的文件
+                self.stats['bytes_saved'] += similar['size']
+                removed, kept = similar['path'], file_path
+                similar.update(path=file_path, size=size, hash=entry['hash'], area=entry['area'])
+                for other in self._by_digest.values():
+                    if other['path'] == removed:
+                        other['path'] = file_path
+                self._kept.pop(removed, None)
+                self._kept[file_path] = (size, digest)
+                replaced = True
+            self._redirects[removed] = kept
+        
+        self._remove(removed)
+        if replaced and on_replace:
+            on_replace(removed, kept)
+        return kept
+    
+    def resolve(self, file_path):
+        """返回文件去重后实际保留的路径（文件被替换时沿重定向查找）"""
+        with self._lock:
+            while file_path in self._redirects:
+                file_path = self._redirects[file_path]
+            return file_path
+    
+    def kept_info(self, file_path):
+        """返回保留文件的 (大小, SHA-256)，不是保留的文件时返回None"""
+        with self._lock:
+            return self._kept.get(file_path)
+    
+    def seed(self, file_path, digest, size):
+        """登记上次运行已下载的文件（不计入统计，也不会删除任何文件）
+        
+        开启perceptual时同时计算感知哈希，之后下载的相似图片仍与这些文件比较。
+        """
+        if not digest:
+            return
+        with self._lock:
+            entry = self._by_digest.setdefault(digest, {'path': file_path, 'size': size, 'hash': None, 'area': 0})
+            self._kept.setdefault(entry['path'], (entry['size'], digest))
+            if not self.perceptual or entry['hash'] is not None or entry in self._perceptual_entries:
+                return
+        
+        try:
+            phash, area = perceptual_hash(file_path)
+        except Exception:
+            return
+        with self._lock:
+            if entry['hash'] is None:
+                entry.update(hash=phash, area=area)
+                self._perceptual_entries.append(entry)
+    
+    def _remove(self, file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+    
+    def summary(self):
+        """去重统计信息"""
+        with self._lock:
+            return dict(self.stats)
+    
+    def describe(self):
+        """用于界面显示的去重统计文字"""
+        stats = self.summary()
+        return (f"去重: 相同内容 {stats['exact_duplicates']} 张，相似图片 {stats['perceptual_duplicates']} 张，"
+                f"节省 {stats['bytes_saved'] / 1024 / 1024:.1f} MB")
+
+
+class DownloadManifest:
+    """下载目录中的清单，记录每个序号/URL对应的文件、大小和SHA-256
+    
+    清单以JSONL格式追加写入，中途崩溃也只会丢失最后一行。重新运行时已完成的条目
+    直接跳过，文件名冲突通过一次listdir得到的文件集合解决，不再逐个探测文件系统。
+    去重后不单独保存的图片记录为duplicate条目，file指向实际保留的文件。
+    """
+    
+    FILENAME = '.sniffer_manifest.jsonl'
+    
+    def __init__(self, save_dir):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        # 键为序号（没有序号时为URL）
+        self.entries = {}
+        # 文件名 -> (序号, URL)
+        self._owners = {}
+        # 去重时被替换删除的文件名 -> (保留的文件名, 大小, SHA-256)
+        self._redirects = {}
+        try:
+            self._files = set(os.listdir(save_dir))
+        except OSError:
+            self._files = set()
+        self.load()
+    
+    @staticmethod
+    def _key(index, url):
+        return str(index) if index is not None else url
+    
+    def load(self):
+        """读取清单，忽略损坏的行"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[self._key(entry.get('index'), entry['url'])] = entry
+                    if not entry.get('duplicate'):
+                        self._owners[entry['file']] = (entry.get('index'), entry['url'])
+        except OSError:
+            pass
+    
+    def lookup(self, index, url):
+        """返回已完成且文件完整的条目，否则返回None"""
+        with self._lock:
+            entry = self.entries.get(self._key(index, url))
+        if not entry or entry['url'] != url:
+            return None
+        
+        try:
+            if os.path.getsize(os.path.join(self.save_dir, entry['file'])) != entry['size']:
+                return None
+        except OSError:
+            return None
+        return entry
+    
+    def claim_path(self, file_path, index, url):
+        """为序号/URL分配最终文件路径，已被其他图片占用时添加后缀"""
+        directory, filename = os.path.split(file_path)
+        base_name, ext = os.path.splitext(filename)
+        
+        with self._lock:
+            counter = 1
+            while filename in self._files and self._owners.get(filename) != (index, url):
+                filename = f"{base_name}_{counter}{ext}"
+                counter += 1
+            self._files.add(filename)
+            self._owners[filename] = (index, url)
+        
+        return os.path.join(directory, filename)
+    
+    def record(self, index, url, file_path, size, sha256, duplicate=False):
+        """追加一条已完成的记录（文件已被去重替换时改为指向保留的文件）"""
+        filename = os.path.basename(file_path)
+        with self._lock:
+            while filename in self._redirects:
+                filename, size, sha256 = self._redirects[filename]
+                duplicate = True
+            entry = {
+                'index': index,
+                'url': url,
+                'file': filename,
+                'size': size,
+                'sha256': sha256,
+                'time': round(time.time(), 3),
+            }
+            if duplicate:
+                entry['duplicate'] = True
+            self.entries[self._key(index, url)] = entry
+            if not duplicate:
+                self._owners[filename] = (index, url)
+            os.makedirs(self.save_dir, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return entry
+    
+    def redirect(self, old_path, new_path, size, sha256):
+        """去重时old_path被new_path替换：指向旧文件的条目（包括之后才记录的）改为指向新文件"""
+        old_name = os.path.basename(old_path)
+        with self._lock:
+            self._redirects[old_name] = (os.path.basename(new_path), size, sha256)
+            affected = [entry for entry in self.entries.values() if entry['file'] == old_name]
+        for entry in affected:
+            self.record(entry.get('index'), entry['url'], new_path, size, sha256, duplicate=True)
+
+
+class RequestContext:
+    """浏览器请求上下文快照：cookies、User-Agent和Referer"""
+    
+    def __init__(self, cookies=None, user_agent=DEFAULT_USER_AGENT, referer=None,
+                 page_url=None, document_cookie=None):
+        self.cookies = dict(cookies or {})
+        self.user_agent = user_agent or DEFAULT_USER_AGENT
+        self.referer = referer
+        # 用于判断快照是否过期：页面地址和document.cookie
+        self.page_url = page_url
+        self.document_cookie = document_cookie
+    
+    def headers(self, accept=IMAGE_ACCEPT):
+        """生成请求头"""
+        headers = {
+            'User-Agent': self.user_agent,
+            'Accept': accept,
+        }
+        if self.referer:
+            headers['Referer'] = self.referer
+        return headers
+    
+    def is_stale(self, page_url, document_cookie):
+        """浏览器跳转或写入新cookie后快照失效"""
+        return page_url != self.page_url or document_cookie != self.document_cookie
+
+
+class DiskCache:
+    """持久化的图片HTTP缓存
+    
+    以URL为键记录ETag/Last-Modified，图片数据按内容哈希存储（相同内容只存一份），
+    超过容量上限时按最近最少使用淘汰。验证、预览和下载共用同一个缓存。
+    多个进程（如批量模式的工作进程）可以共用同一个缓存目录：保存索引时在锁文件保护下
+    与磁盘上的索引合并，其他进程写入的条目不会丢失。
+    """
+    
+    # 锁文件超过该时间（秒）未释放视为持有者已崩溃
+    LOCK_STALE_SECONDS = 30
+    # 索引中没有引用且超过该时间（秒）的数据文件视为孤立文件，加载时删除
+    ORPHAN_SECONDS = 3600
+    
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 * 1024, fresh_seconds=300):
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.cache', 'image_sniffer', 'http')
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self.lock_path = self.index_path + '.lock'
+        self.max_bytes = max_bytes
+        # 在该时间内的缓存直接使用，不再向服务器确认
+        self.fresh_seconds = fresh_seconds
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        # 上次保存后本进程删除的URL -> 删除时间，合并时不再从磁盘索引中恢复
+        self._removed = {}
+        self.index = {}
+        # 内容哈希 -> [文件大小, 引用数]
+        self._objects = {}
+        self.load()
+    
+    def load(self):
+        """读取缓存索引，并删除不被任何条目引用的旧数据文件"""
+        self.index = self._read_index()
+        self._rebuild_objects()
+        self._remove_orphans()
+    
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _rebuild_objects(self):
+        """按索引重新统计数据文件的引用数，删除数据文件已丢失的条目"""
+        self._objects = {}
+        for url, entry in list(self.index.items()):
+            if not os.path.exists(self._object_path(entry['digest'])):
+                del self.index[url]
+                continue
+            obj = self._objects.setdefault(entry['digest'], [entry['size'], 0])
+            obj[1] += 1
+    
+    def _remove_orphans(self):
+        """删除索引中没有引用的数据文件（其他进程刚写入、尚未保存索引的文件不会被删除）"""
+        cutoff = time.time() - self.ORPHAN_SECONDS
+        try:
+            prefixes = os.listdir(self.objects_dir)
+        except OSError:
+            return
+        for prefix in prefixes:
+            directory = os.path.join(self.objects_dir, prefix)
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name in self._objects:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+    
+    @contextmanager
+    def _index_lock(self):
+        """跨进程的索引锁（以独占方式创建锁文件），持有者崩溃留下的锁超时后强制获取"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > self.LOCK_STALE_SECONDS:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(0.05)
+        try:
+            os.close(fd)
+            yield
+        finally:
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+    
+    def save(self):
+        """写入缓存索引（先写临时文件再替换，避免中途退出损坏索引）
+        
+        写入前与磁盘上的索引合并：其他进程新增或更新的条目保留，本进程删除的条目不恢复，
+        合并后再按容量上限淘汰。
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            with self._index_lock():
+                for url, entry in self._read_index().items():
+                    removed_at = self._removed.get(url)
+                    if removed_at is not None and entry['stored_at'] <= removed_at:
+                        continue
+                    current = self.index.get(url)
+                    if current is None or entry['stored_at'] > current['stored_at']:
+                        self.index[url] = entry
+                    elif entry['last_access'] > current['last_access']:
+                        current['last_access'] = entry['last_access']
+                self._rebuild_objects()
+                self._evict()
+                
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_path, self.index_path)
+            self._removed = {}
+            self._dirty = 0
+    
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+    
+    def total_bytes(self):
+        """缓存中图片数据的总大小"""
+        return sum(size for size, _ in self._objects.values())
+    
+    def get(self, url):
+        """查找缓存条目，找到时更新最近访问时间"""
+        with self._lock:
+            entry = self.index.get(url)
+            if entry:
+                entry['last_access'] = time.time()
+            return entry
+    
+    def is_fresh(self, entry):
+        return time.time() - entry['stored_at'] < self.fresh_seconds
+    
+    def read(self, url, entry):
+        """读取缓存的图片数据，文件丢失时删除该条目"""
+        try:
+            with open(self._object_path(entry['digest']), 'rb') as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._remove(url)
+            return None
+    
+    def conditional_headers(self, entry):
+        """生成条件请求头"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+    
+    def store(self, url, data, response_headers=None):
+        """保存图片数据，返回缓存条目"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        
+        return self._add_entry(url, digest, len(data), response_headers)
+    
+    def store_file(self, url, file_path, digest, response_headers=None):
+        """把已下载完成的文件复制到缓存（digest为文件内容的SHA-256），返回缓存条目"""
+        path = self._object_path(digest)
+        
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, path)
+        
+        return self._add_entry(url, digest, os.path.getsize(path), response_headers)
+    
+    def _add_entry(self, url, digest, size, response_headers):
+        response_headers = response_headers or {}
+        now = time.time()
+        entry = {
+            'digest': digest,
+            'size': size,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'content_type': response_headers.get('Content-Type', ''),
+            'stored_at': now,
+            'last_access': now,
+        }
+        
+        with self._lock:
+            self._remove(url)
+            self.index[url] = entry
+            obj = self._objects.setdefault(digest, [size, 0])
+            obj[1] += 1
+            self.stats['stores'] += 1
+            self._evict()
+            self._dirty += 1
+            need_save = self._dirty >= 20
+        
+        if need_save:
+            self.save()
+        return entry
+    
+    def revalidated(self, url, response_headers):
+        """服务器返回304后刷新条目的时间和验证信息"""
+        with self._lock:
+            entry = self.index.get(url)
+            if not entry:
+                return None
+            entry['stored_at'] = time.time()
+            if response_headers.get('ETag'):
+                entry['etag'] = response_headers['ETag']
+            if response_headers.get('Last-Modified'):
+                entry['last_modified'] = response_headers['Last-Modified']
+            self.stats['revalidated'] += 1
+            self._dirty += 1
+            return entry
+    
+    def record(self, hit):
+        """记录一次命中或未命中"""
+        with self._lock:
+            self.stats['hits' if hit else 'misses'] += 1
+    
+    def _remove(self, url):
+        """删除条目，数据文件没有其他URL引用时一并删除（需持有锁）"""
+        entry = self.index.pop(url, None)
+        if not entry:
+            return
+        self._removed[url] = time.time()
+        obj = self._objects.get(entry['digest'])
+        if obj:
+            obj[1] -= 1
+            if obj[1] <= 0:
+                del self._objects[entry['digest']]
+                try:
+                    os.remove(self._object_path(entry['digest']))
+                except OSError:
+                    pass
+        self._dirty += 1
+    
+    def _evict(self):
+        """超过容量上限时按最近访问时间淘汰（需持有锁）"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            obj = self._objects.get(entry['digest'])
+            if obj and obj[1] == 1:
+                total -= obj[0]
+            self._remove(url)
+            self.stats['evictions'] += 1
+    
+    def summary(self):
+        """缓存统计信息"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            hit_rate = self.stats['hits'] / lookups if lookups else 0.0
+            return dict(self.stats, entries=len(self.index), bytes=self.total_bytes(),
+                        hit_rate=round(hit_rate, 3))
+
+
+def parse_srcset(srcset):
+    """按HTML规范解析srcset，返回 [(URL, 宽度w或None, 像素密度x或None), ...]；没有描述符时视为1x
+    
+    URL是连续的非空白字符（结尾的逗号表示候选结束），描述符一直到下一个逗号为止，
+    因此 "a.jpg 1x,b.jpg 2x" 这种逗号后没有空格的写法也能正确解析。
+    """
+    srcset = srcset or ''
+    variants = []
+    position, length = 0, len(srcset)
+    
+    while position < length:
+        # 跳过候选之间的空白和逗号
+        while position < length and (srcset[position].isspace() or srcset[position] == ','):
+            position += 1
+        if position >= length:
+            break
+        
+        start = position
+        while position < length and not srcset[position].isspace():
+            position += 1
+        url = srcset[start:position]
+        
+        descriptors = []
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            start = position
+            depth = 0
+            while position < length and (srcset[position] != ',' or depth):
+                if srcset[position] == '(':
+                    depth += 1
+                elif srcset[position] == ')':
+                    depth = max(0, depth - 1)
+                position += 1
+            descriptors = srcset[start:position].split()
+        if not url:
+            continue
+        
+        width = density = None
+        for descriptor in descriptors or ['1x']:
+            descriptor = descriptor.lower()
+            try:
+                if descriptor.endswith('w'):
+                    width = int(float(descriptor[:-1]))
+                elif descriptor.endswith('x'):
+                    density = float(descriptor[:-1])
+            except ValueError:
+                pass
+        variants.append((url, width, density))
+    return variants
+
+
+_META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.I)
+
+
+def decode_html(response):
+    """按响应头charset、<meta charset>、内容推测的顺序确定编码并解码HTML
+    
+    requests对没有charset的text/html默认使用ISO-8859-1，会把韩文等非ASCII的图片路径解码成乱码。
+    """
+    content = response.content
+    candidates = []
+    content_type = response.headers.get('Content-Type', '')
+    if 'charset=' in content_type.lower():
+        candidates.append(response.encoding)
+    match = _META_CHARSET_PATTERN.search(content[:4096])
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    candidates.append(response.apparent_encoding)
+    
+    for encoding in candidates:
+        if not encoding:
+            continue
+        try:
+            return content.decode(encoding, errors='replace')
+        except LookupError:
+            continue
+    return content.decode('utf-8', errors='replace')
+
+
+class StaticImageParser(HTMLParser):
+    """不启动浏览器，直接从HTML源码中收集候选图片
+    
+    与harvest_image_candidates的来源和格式一致：img的src、data-src、data-original、
+    其他data-*懒加载属性、srcset、<picture><source>，以及style属性中的背景图片（放在最后）。
+    同一个img（或picture）的候选图片带有相同的group，srcset中的候选带有w/x描述符，
+    rw/rh为width/height属性（渲染尺寸的近似值）。
+    """
+    
+    _URL_PATTERN = re.compile(r'^(https?:)?//|^/|\.(jpe?g|png|gif|webp|bmp|svg|avif)(\?|#|$)', re.I)
+    _BACKGROUND_PATTERN = re.compile(r'url\(\s*([\'"]?)(.*?)\1\s*\)', re.I)
+    
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.candidates = []
+        self.backgrounds = []
+        self._picture_depth = 0
+        self._group = 0
+        self._rendered_width = None
+        self._rendered_height = None
+    
+    def _add(self, url, source, target=None, width=None, density=None):
+        if not url:
+            return
+        url = url.strip()
+        if not url or url.startswith('data:'):
+            return
+        candidate = {'url': urljoin(self.base_url, url), 'source': source}
+        if target is None:
+            candidate.update(group=self._group, w=width, x=density,
+                             rw=self._rendered_width, rh=self._rendered_height)
+            self.candidates.append(candidate)
+        else:
+            target.append(candidate)
+    
+    def _add_srcset(self, srcset, source):
+        for url, width, density in parse_srcset(srcset):
+            self._add(url, source, width=width, density=density)
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        
+        if tag == 'base' and attrs.get('href'):
+            self.base_url = urljoin(self.base_url, attrs['href'])
+        elif tag == 'picture':
+            if not self._picture_depth:
+                self._group += 1
+                self._rendered_width = self._rendered_height = None
+            self._picture_depth += 1
+        elif tag == 'source' and self._picture_depth:
+            self._add_srcset(attrs.get('srcset') or attrs.get('data-srcset'), 'picture')
+        elif tag == 'img':
+            if not self._picture_depth:
+                self._group += 1
+            width = (attrs.get('width') or '').strip()
+            height = (attrs.get('height') or '').strip()
+            self._rendered_width = int(width) if width.isdigit() else None
+            self._rendered_height = int(height) if height.isdigit() else None
+            self._add(attrs.get('src'), 'src')
+            self._add(attrs.get('data-src'), 'data-src')
+            self._add(attrs.get('data-original'), 'data-original')
+            
+            # 其他data-*懒加载属性
+            for name, value in attrs.items():
+                if not name.startswith('data-') or name in ('data-src', 'data-original') or not value:
+                    continue
+                if 'srcset' in name:
+                    self._add_srcset(value, name)
+                elif self._URL_PATTERN.search(value.strip()):
+                    self._add(value, name)
+            
+            self._add_srcset(attrs.get('srcset'), 'srcset')
+        
+        style = attrs.get('style')
+        if style and 'url(' in style:
+            for match in self._BACKGROUND_PATTERN.finditer(style):
+                self._add(match.group(2), 'background', self.backgrounds)
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == 'picture':
+            self._picture_depth -= 1
+    
+    def handle_endtag(self, tag):
+        if tag == 'picture' and self._picture_depth:
+            self._picture_depth -= 1
+    
+    def close(self):
+        super().close()
+        return self.candidates + self.backgrounds
+
+
+class SniffMetrics:
+    """嗅探过程的结构化指标（线程安全）
+    
+    phases记录各阶段的次数、总耗时和最长耗时，counters记录WebDriver调用、
+    HTTP请求数与字节数、缓存命中、重试和失败等计数。外部收集器可以通过
+    add_hook(callback) 接收每条指标，callback(event) 的event为
+    {'type': 'phase' 或 'counter', 'name': 名称, 'value': 耗时秒数或增量}。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.reset()
+    
+    def reset(self):
+        """清空指标，开始新一次嗅探的统计"""
+        with self._lock:
+            self.started = time.time()
+            self.phases = {}
+            self.counters = {}
+    
+    def add_hook(self, callback):
+        self._hooks.append(callback)
+    
+    def remove_hook(self, callback):
+        if callback in self._hooks:
+            self._hooks.remove(callback)
+    
+    def _emit(self, event_type, name, value):
+        for hook in list(self._hooks):
+            try:
+                hook({'type': event_type, 'name': name, 'value': value})
+            except Exception as e:
+                logger.warning(f"指标收集器出错: {e}")
+    
+    def observe(self, name, seconds):
+        """记录一次阶段耗时"""
+        with self._lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = self.phases[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            phase['count'] += 1
+            phase['total'] += seconds
+            phase['max'] = max(phase['max'], seconds)
+        self._emit('phase', name, seconds)
+    
+    @contextmanager
+    def phase(self, name):
+        """统计代码块耗时：with metrics.phase('scroll_page'): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+    
+    def incr(self, name, value=1):
+        """增加计数"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self._emit('counter', name, value)
+    
+    def summary(self):
+        """返回可序列化为JSON的指标汇总"""
+        with self._lock:
+            return {
+                'elapsed': round(time.time() - self.started, 3),
+                'phases': {
+                    name: {'count': phase['count'], 'total': round(phase['total'], 4),
+                           'max': round(phase['max'], 4)}
+                    for name, phase in sorted(self.phases.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+            }
+    
+    def to_json(self):
+        return json.dumps(self.summary(), ensure_ascii=False)
+
+
+class InstrumentedDriver:
+    """WebDriver代理：统计每种WebDriver方法的调用次数和耗时，其余属性原样转发"""
+    
+    def __init__(self, driver, metrics):
+        self.wrapped_driver = driver
+        self._metrics = metrics
+    
+    def __getattr__(self, name):
+        attr = getattr(self.wrapped_driver, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        
+        metrics = self._metrics
+        
+        def call(*args, **kwargs):
+            metrics.incr('webdriver.calls')
+            with metrics.phase(f'webdriver.{name}'):
+                return attr(*args, **kwargs)
+        return call
+
+
+class HostScheduler:
+    """按主机自适应调度HTTP请求：令牌桶限速 + AIMD并发窗口
+    
+    每个主机有一个并发窗口（最多max_concurrency个请求同时等待响应头）。
+    成功的请求让窗口缓慢增大（每次+1/窗口），429/503或带Retry-After的响应让窗口减半、
+    按观测到的请求速率的一半开启令牌桶限速，并在Retry-After（没有时按指数退避）
+    期间暂停该主机的新请求。限速之后每次成功让速率按rate_growth的比例增长，
+    暂停期过后连续recover_after次成功即取消限速，一次偶发的429不会让主机一直被限速。
+    """
+    
+    THROTTLE_STATUS = {429, 503}
+    
+    def __init__(self, max_concurrency=4, min_rate=0.5, rate_growth=0.2, recover_after=10, max_backoff=60):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_rate = min_rate
+        self.rate_growth = rate_growth
+        self.recover_after = max(1, recover_after)
+        self.max_backoff = max_backoff
+        self._hosts = {}
+        self._condition = threading.Condition()
+    
+    def _host(self, host):
+        """获取主机状态（需持有锁）"""
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {
+                'limit': float(self.max_concurrency),
+                'active': 0,
+                'rate': None,
+                'tokens': 1.0,
+                'refilled': time.monotonic(),
+                'blocked_until': 0.0,
+                'backoff': 1.0,
+                # 限速后连续成功的次数
+                'successes': 0,
+                'recent': deque(maxlen=50),
+                'started': time.time(),
+                'requests': 0,
+                'throttled': 0,
+                'errors': 0,
+                'bytes': 0,
+            }
+        return state
+    
+    def _refill(self, state, now):
+        if state['rate'] is not None:
+            burst = max(1.0, state['limit'])
+            state['tokens'] = min(burst, state['tokens'] + (now - state['refilled']) * state['rate'])
+        state['refilled'] = now
+    
+    def acquire(self, host):
+        """等待直到该主机允许再发一个请求"""
+        with self._condition:
+            state = self._host(host)
+            while True:
+                now = time.monotonic()
+                self._refill(state, now)
+                wait = state['blocked_until'] - now
+                if wait <= 0 and state['active'] >= int(state['limit']):
+                    wait = None
+                elif wait <= 0 and state['rate'] is not None and state['tokens'] < 1:
+                    wait = (1 - state['tokens']) / state['rate']
+                elif wait <= 0:
+                    break
+                self._condition.wait(wait)
+            
+            if state['rate'] is not None:
+                state['tokens'] -= 1
+            state['active'] += 1
+            state['requests'] += 1
+            state['recent'].append(now)
+    
+    @staticmethod
+    def retry_after(headers):
+        """解析Retry-After响应头（秒数或HTTP日期），返回秒数或None"""
+        value = (headers or {}).get('Retry-After')
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    
+    def release(self, host, status=None, headers=None, nbytes=0):
+        """请求收到响应头（或出错，status为None）后调用，返回是否被限流
+        
+        nbytes为响应体字节数（按Content-Length），用于吞吐统计。
+        """
+        retry_after = self.retry_after(headers) if status and status >= 400 else None
+        throttled = status in self.THROTTLE_STATUS or retry_after is not None
+        
+        with self._condition:
+            state = self._host(host)
+            state['active'] -= 1
+            now = time.monotonic()
+            
+            if throttled:
+                state['throttled'] += 1
+                state['limit'] = max(1.0, state['limit'] / 2)
+                # 按最近观测到的速率（与当前限速取较小值）的一半限速；样本不足时按并发窗口估算
+                recent = state['recent']
+                window = now - recent[0] if len(recent) > 1 else 0.0
+                observed = (len(recent) - 1) / window if window > 0 else None
+                rates = [rate for rate in (state['rate'], observed) if rate is not None]
+                base = min(rates) if rates else float(self.max_concurrency)
+                state['rate'] = max(self.min_rate, base / 2)
+                state['successes'] = 0
+                state['tokens'] = min(state['tokens'], 0.0)
+                delay = retry_after if retry_after is not None else state['backoff']
+                state['backoff'] = min(self.max_backoff, state['backoff'] * 2)
+                state['blocked_until'] = max(state['blocked_until'], now + min(delay, self.max_backoff))
+            elif status is None:
+                # 连接错误或超时：缩小窗口但不暂停
+                state['errors'] += 1
+                state['limit'] = max(1.0, state['limit'] / 2)
+            else:
+                state['backoff'] = 1.0
+                state['limit'] = min(float(self.max_concurrency), state['limit'] + 1 / state['limit'])
+                if state['rate'] is not None:
+                    state['successes'] += 1
+                    state['rate'] *= 1 + self.rate_growth
+                    if state['successes'] >= self.recover_after and now >= state['blocked_until']:
+                        state['rate'] = None
+                state['bytes'] += nbytes
+            
+            self._condition.notify_all()
+        return throttled
+    
+    def stats(self):
+        """各主机的调度统计（可序列化为JSON）"""
+        with self._condition:
+            result = {}
+            for host, state in self._hosts.items():
+                elapsed = max(time.time() - state['started'], 1e-6)
+                result[host] = {
+                    'requests': state['requests'],
+                    'throttled': state['throttled'],
+                    'errors': state['errors'],
+                    'bytes': state['bytes'],
+                    'in_flight': state['active'],
+                    'concurrency': round(state['limit'], 2),
+                    'rate_limit': round(state['rate'], 2) if state['rate'] is not None else None,
+                    'requests_per_sec': round(state['requests'] / elapsed, 2),
+                    'bytes_per_sec': round(state['bytes'] / elapsed, 1),
+                }
+            return result
+
+
 class SeleniumImageSniffer:
     """使用Selenium的高级图片嗅探器"""
     
-    def __init__(self):
+    # 探测图片时读取的字节数，足够覆盖常见格式的尺寸信息
+    PROBE_BYTES = 32 * 1024
+    
+    def __init__(self, max_workers=8, per_host_limit=4, scroll_step=None,
+                 scroll_idle_ms=500, scroll_time_budget=60, capture_network=False,
+                 reuse_browser_bodies=False, cache=None, driver_pool=None, metrics=None,
+                 fetch_mode='browser', static_min_images=3, srcset_density=None,
+                 min_dom_size=40, deny_patterns=None, lean_profile=True, block_images=False,
+                 blocked_url_patterns=None):
+        # 浏览器驱动（InstrumentedDriver代理，wrapped_driver为真正的WebDriver）
         self.driver = None
+        # 结构化指标（SniffMetrics），可传入共享实例以接入外部收集器
+        self.metrics = metrics or SniffMetrics()
+        # 页面获取方式：browser只用浏览器；auto先直接请求HTML解析，遇到403、验证页面或
+        # 图片少于static_min_images张时再用浏览器；static只解析HTML
+        self.fetch_mode = fetch_mode
+        self.static_min_images = static_min_images
+        # 同一元素有多个尺寸（srcset/picture）时选择的像素密度，None为分辨率最高的候选
+        self.srcset_density = srcset_density
+        # 首选URL -> 备选URL列表（同一元素的其他尺寸），由_candidate_urls生成
+        self.fallback_urls = {}
+        # 发请求前的预过滤：页面报告的尺寸（自然尺寸，未加载时为渲染尺寸）任一边小于
+        # min_dom_size（或更大的min_width/min_height）的图片，以及URL匹配deny_patterns的图片直接丢弃
+        self.min_dom_size = min_dom_size
+        self.deny_patterns = [re.compile(pattern, re.I) for pattern in
+                              (self.DEFAULT_DENY_PATTERNS if deny_patterns is None else deny_patterns)]
+        self._dom_thresholds = (min_dom_size, min_dom_size)
+        # 需要浏览器时按此设置启动（create_driver会更新）
+        self.headless = True
+        # 精简加载：eager加载策略（DOM就绪即返回），并通过CDP屏蔽字体、音视频和统计/广告请求；
+        # block_images额外屏蔽图片内容（图片URL仍从DOM中收集，记录网络日志时不屏蔽）
+        self.lean_profile = lean_profile
+        self.block_images = block_images
+        self.blocked_url_patterns = list(self.LEAN_BLOCKED_PATTERNS if blocked_url_patterns is None
+                                         else blocked_url_patterns)
+        # 最近一次嗅探的错误信息，成功时为None
+        self.last_error = None
+        # 浏览器驱动池（DriverPool），为None时每次都启动新的浏览器
+        self.driver_pool = driver_pool
+        # 磁盘HTTP缓存（DiskCache），为None时不使用缓存
+        self.cache = cache
+        # WebDriver不是线程安全的，下载线程读取浏览器数据时需要加锁
+        self._driver_lock = threading.RLock()
+        # 从Chrome网络日志中读取图片信息，浏览器已加载过的图片不再重复请求
+        self.capture_network = capture_network
+        # 下载和预览时直接使用浏览器已收到的图片数据（依赖网络日志中的requestId）
+        self.reuse_browser_bodies = reuse_browser_bodies
+        self.network_images = {}
+        self._network_requests = {}
+        # 滚动参数：每步滚动像素（None为视口高度的80%）、网络空闲判定时间（毫秒）、总时间上限（秒）
+        self.scroll_step = scroll_step
+        self.scroll_idle_ms = scroll_idle_ms
+        self.scroll_time_budget = scroll_time_budget
+        # 并发验证参数：总工作线程数与单个主机的最大并发数
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        # 所有HTTP请求经过按主机的自适应调度器，被限流（429/503）时最多自动重试throttle_retries次
+        self.scheduler = HostScheduler(max_concurrency=self.per_host_limit)
+        self.throttle_retries = 3
+        # 请求上下文快照，浏览器关闭后仍保留最后一次的快照用于下载
+        self.context = RequestContext()
+        # 滚动过程中增量收集到的CSS背景图片（按发现顺序）
+        self._background_urls = []
+        self._background_seen = set()
         self.session = requests.Session()
         self.setup_session()
     
     def setup_session(self):
         """设置requests会话"""
+        # 连接池大小与并发数保持一致，避免并发时连接被丢弃重建
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # 通过响应钩子统计所有HTTP请求
+        self.session.hooks['response'].append(self._record_response)
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'User-Agent': DEFAULT_USER_AGENT,
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7,zh-CN;q=0.6,zh;q=0.5',
             'Accept-Encoding': 'gzip, deflate, br',
@@ -50,61 +1381,147 @@ class SeleniumImageSniffer:
             'Sec-Fetch-User': '?1',
         })
     
+    def _record_response(self, response, *args, **kwargs):
+        """requests响应钩子：统计请求数、状态码和响应字节数（按Content-Length）"""
+        self.metrics.incr('http.requests')
+        self.metrics.incr(f'http.status.{response.status_code}')
+        length = response.headers.get('Content-Length', '')
+        if response.request.method != 'HEAD' and length.isdigit():
+            self.metrics.incr('http.bytes', int(length))
+    
+    def _record_cache(self, hit):
+        """记录一次磁盘缓存命中或未命中"""
+        self.cache.record(hit=hit)
+        self.metrics.incr('cache.hits' if hit else 'cache.misses')
+    
+    # 精简加载时屏蔽的请求（CDP Network.setBlockedURLs通配符）：字体、音视频和常见统计/广告脚本
+    LEAN_BLOCKED_PATTERNS = tuple(
+        pattern for ext in ('woff', 'woff2', 'ttf', 'otf', 'eot', 'mp4', 'webm', 'm3u8', 'mp3', 'm4a', 'ogg')
+        for pattern in (f'*.{ext}', f'*.{ext}?*')
+    ) + (
+        '*doubleclick.net*', '*googlesyndication.com*', '*google-analytics.com*',
+        '*googletagmanager.com*', '*googletagservices.com*', '*adservice.google.*',
+        '*connect.facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*scorecardresearch.com*',
+        '*amazon-adsystem.com*', '*criteo.*', '*taboola.com*', '*outbrain.com*',
+    )
+    
+    def _driver_key(self, headless, network_log=None):
+        """浏览器配置标识，配置相同的浏览器才能在驱动池中复用"""
+        if network_log is None:
+            network_log = self.capture_network or self.reuse_browser_bodies
+        # 需要从网络日志读取图片时不能屏蔽图片
+        block_images = self.block_images and not network_log
+        return (bool(headless), bool(network_log), bool(self.lean_profile), bool(block_images))
+    
+    def _launch_driver(self, key):
+        """按配置标识启动一个新的Chrome浏览器"""
+        headless, network_log, lean, block_images = key
+        chrome_options = Options()
+        
+        if headless:
+            chrome_options.add_argument('--headless')
+        
+        # 精简加载：DOMContentLoaded后driver.get即返回，不等待字体、广告等子资源
+        if lean:
+            chrome_options.page_load_strategy = 'eager'
+        if block_images:
+            chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        
+        # 基本设置
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-web-security')
+        chrome_options.add_argument('--disable-features=VizDisplayCompositor')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-plugins')
+        
+        # 反检测设置
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        
+        # 设置User-Agent
+        chrome_options.add_argument(f'--user-agent={DEFAULT_USER_AGENT}')
+        
+        # 设置语言
+        chrome_options.add_argument('--lang=ko-KR')
+        
+        # 设置窗口大小
+        chrome_options.add_argument('--window-size=1920,1080')
+        
+        # 开启性能日志以记录Network事件
+        if network_log:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+        
+        # 创建驱动（ChromeDriver路径解析一次后缓存）
+        service = Service(resolve_chromedriver_path())
+        try:
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        except SessionNotCreatedException as e:
+            # 通常是Chrome已自动更新而缓存的ChromeDriver版本过旧，重新查找后再试一次
+            logger.warning(f"ChromeDriver无法创建会话，重新获取ChromeDriver: {e}")
+            service = Service(resolve_chromedriver_path(refresh=True))
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        
+        # 执行反检测脚本
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        
+        # 屏蔽规则对之后的所有页面生效，浏览器在驱动池中复用时无需重新设置
+        if lean and self.blocked_url_patterns:
+            try:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_url_patterns})
+            except Exception as e:
+                logger.warning(f"设置请求屏蔽规则失败: {e}")
+        
+        return driver
+    
     def create_driver(self, headless=True):
-        """创建Chrome浏览器驱动"""
+        """创建Chrome浏览器驱动（设置了驱动池时从池中取出）"""
         try:
-            chrome_options = Options()
-            
-            if headless:
-                chrome_options.add_argument('--headless')
-            
-            # 基本设置
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--disable-web-security')
-            chrome_options.add_argument('--disable-features=VizDisplayCompositor')
-            chrome_options.add_argument('--disable-extensions')
-            chrome_options.add_argument('--disable-plugins')
-            chrome_options.add_argument('--disable-images')  # 初始禁用图片加载以提高速度
-            
-            # 反检测设置
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            # 设置User-Agent
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            # 设置语言
-            chrome_options.add_argument('--lang=ko-KR')
-            
-            # 设置窗口大小
-            chrome_options.add_argument('--window-size=1920,1080')
+            # 先归还或关闭之前的浏览器，避免Chrome进程泄漏
+            if self.driver:
+                self.close()
             
-            # 创建驱动（自动管理ChromeDriver）
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            self.headless = headless
+            key = self._driver_key(headless)
+            with self.metrics.phase('create_driver'):
+                if self.driver_pool:
+                    driver = self.driver_pool.acquire(key)
+                else:
+                    driver = self._launch_driver(key)
+            self.driver = InstrumentedDriver(driver, self.metrics)
             
-            # 执行反检测脚本
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            # 扩大浏览器保留响应数据的缓冲区，便于之后通过CDP取回图片数据
+            if self.reuse_browser_bodies:
+                self.driver.execute_cdp_cmd('Network.enable', {
+                    'maxTotalBufferSize': 512 * 1024 * 1024,
+                    'maxResourceBufferSize': 64 * 1024 * 1024,
+                })
             
             return True
             
         except Exception as e:
-            print(f"创建浏览器驱动失败: {e}")
+            self.metrics.incr('driver.failures')
+            logger.error(f"创建浏览器驱动失败: {e}")
             return False
     
     def wait_for_page_load(self, timeout=30):
-        """等待页面完全加载"""
+        """等待页面DOM就绪，然后滚动页面触发懒加载"""
+        with self.metrics.phase('wait_for_page_load'):
+            return self._wait_for_page_load(timeout)
+    
+    def _wait_for_page_load(self, timeout):
         try:
-            # 等待页面基本加载完成
+            # 只等待DOM就绪（interactive），图片由之后的滚动逐步等待加载
             WebDriverWait(self.driver, timeout).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
+                lambda driver: driver.execute_script("return document.readyState") in ("interactive", "complete")
             )
             
-            # 额外等待JavaScript执行
-            time.sleep(2)
+            # 在滚动前注入背景图片收集器，记录滚动过程中出现的所有背景图片
+            self.install_background_collector()
             
             # 滚动页面触发懒加载
             self.scroll_page()
@@ -112,216 +1529,1057 @@ class SeleniumImageSniffer:
             return True
             
         except TimeoutException:
-            print("页面加载超时")
+            self.metrics.incr('page.timeouts')
+            logger.warning("页面加载超时")
             return False
     
-    def scroll_page(self):
-        """滚动页面以触发懒加载"""
+    def scroll_page(self, step=None, idle_ms=None, time_budget=None, step_timeout=10):
+        """按视口逐步滚动页面以触发懒加载
+        
+        每滚动一步，在页面内等待视口附近的图片加载完成且资源请求空闲idle_ms毫秒后
+        再继续，单步最多等待step_timeout秒；整个滚动过程不超过time_budget秒。
+        """
+        step = step if step is not None else self.scroll_step
+        idle_ms = idle_ms if idle_ms is not None else self.scroll_idle_ms
+        time_budget = time_budget if time_budget is not None else self.scroll_time_budget
+        
+        script = """
+        var step = arguments[0], idleMs = arguments[1], timeoutMs = arguments[2];
+        var done = arguments[arguments.length - 1];
+        
+        if (!window.__imageSnifferScroll) {
+            window.__imageSnifferScroll = true;
+            // 扩大资源计时缓冲区，否则超过250条后无法感知新请求
+            if (performance.setResourceTimingBufferSize) {
+                performance.setResourceTimingBufferSize(100000);
+            }
+        }
+        
+        window.scrollBy(0, step || Math.floor(window.innerHeight * 0.8));
+        
+        function pendingImages() {
+            var imgs = document.getElementsByTagName('img');
+            var viewport = window.innerHeight;
+            var pending = 0;
+            for (var i = 0; i < imgs.length; i++) {
+                if (imgs[i].complete) continue;
+                var rect = imgs[i].getBoundingClientRect();
+                if (rect.bottom > -viewport && rect.top < viewport * 2) pending++;
+            }
+            return pending;
+        }
+        
+        var start = performance.now();
+        var lastCount = performance.getEntriesByType('resource').length;
+        var lastChange = start;
+        
+        function finish() {
+            var c = window.__imageSnifferBg;
+            var height = document.documentElement.scrollHeight;
+            done({
+                height: height,
+                scrollY: window.scrollY,
+                atBottom: window.scrollY + window.innerHeight >= height - 2,
+                bg: c ? c.drain() : []
+            });
+        }
+        
+        (function poll() {
+            var now = performance.now();
+            var count = performance.getEntriesByType('resource').length;
+            if (count !== lastCount) {
+                lastCount = count;
+                lastChange = now;
+            }
+            if ((pendingImages() === 0 && now - lastChange >= idleMs) || now - start >= timeoutMs) {
+                finish();
+            } else {
+                setTimeout(poll, 100);
+            }
+        })();
+        """
+        
+        scroll_started = time.perf_counter()
         try:
-            # 获取页面高度
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
+            self.driver.set_script_timeout(step_timeout + 5)
+            deadline = time.time() + time_budget
+            last_height = None
+            last_step = None
             
             while True:
-                # 滚动到页面底部
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                result = self.driver.execute_async_script(script, step or 0, idle_ms, step_timeout * 1000)
+                self.metrics.incr('scroll.steps')
+                self._add_background_urls(result['bg'])
+                if self.capture_network or self.reuse_browser_bodies:
+                    self.collect_network_images()
                 
-                # 等待新内容加载
-                time.sleep(2)
+                # 到达底部且高度不再增长（没有无限滚动加载新内容）时结束
+                if result['atBottom']:
+                    if result['height'] == last_height:
+                        break
+                    last_height = result['height']
                 
-                # 计算新的页面高度
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
+                # 窗口本身无法滚动（内容在内部滚动容器中）时scrollY不变，高度也不变就结束
+                step_state = (result['scrollY'], result['height'])
+                if step_state == last_step:
+                    logger.debug("页面没有继续滚动，停止滚动")
+                    break
+                last_step = step_state
                 
-                if new_height == last_height:
+                if time.time() >= deadline:
+                    logger.info(f"滚动达到时间上限 {time_budget} 秒，停止滚动")
                     break
-                    
-                last_height = new_height
             
             # 滚动回顶部
             self.driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
             
         except Exception as e:
-            print(f"滚动页面时出错: {e}")
+            self.metrics.incr('scroll.failures')
+            logger.warning(f"滚动页面时出错: {e}")
+        finally:
+            self.metrics.observe('scroll_page', time.perf_counter() - scroll_started)
+    
+    def extract_images_from_page(self, url, min_size_kb=10, min_width=0, min_height=0, on_image=None):
+        """从页面提取图片信息
+        
+        on_image(img_info) 会在每张图片通过验证后立即调用，便于界面实时显示。
+        """
+        valid_images = []
+        for img_info in self.iter_images_from_page(url, min_size_kb, min_width, min_height):
+            valid_images.append(img_info)
+            if on_image:
+                on_image(img_info)
+        return valid_images
     
-    def extract_images_from_page(self, url, min_size_kb=10):
-        """从页面提取图片信息"""
+    def iter_images_from_page(self, url, min_size_kb=10, min_width=0, min_height=0):
+        """从页面提取图片信息（生成器），每张图片通过验证后立即返回，保持页面顺序
+        
+        fetch_mode为auto或static时先直接请求HTML解析；需要浏览器而浏览器尚未启动时
+        按self.headless自动启动。失败原因记录在self.last_error中。
+        """
+        self.last_error = None
+        # 页面报告的尺寸已经小于验证阈值的图片不需要再发请求
+        self._dom_thresholds = (max(self.min_dom_size, min_width), max(self.min_dom_size, min_height))
         try:
-            print(f"正在访问: {url}")
+            image_urls = None
+            if self.fetch_mode in ('auto', 'static'):
+                image_urls = self.collect_static_image_urls(url)
+                if image_urls is None and self.fetch_mode == 'static':
+                    raise Exception("静态抓取失败，页面可能需要浏览器渲染")
+            
+            if image_urls is None:
+                image_urls = self.collect_browser_image_urls(url)
+            
+            self.metrics.incr('images.candidates', len(image_urls))
+            logger.info(f"找到 {len(image_urls)} 个图片URL")
+            
+            # 并发验证图片并获取详细信息，保持原始顺序，不按大小排序
+            count = 0
+            for img_info in self.iter_validated_images(image_urls, min_size_kb, min_width, min_height,
+                                                       fallbacks=self.fallback_urls):
+                count += 1
+                self.metrics.incr('images.valid')
+                yield img_info
+            
+            logger.info(f"嗅探完成，找到 {count} 张有效图片")
+            if self.cache:
+                logger.info(f"缓存统计: {self.cache.summary()}")
             
-            # 访问页面
+        except Exception as e:
+            self.last_error = str(e)
+            self.metrics.incr('sniff.failures')
+            logger.error(f"提取图片失败: {e}")
+        finally:
+            logger.debug(f"嗅探指标: {self.metrics.to_json()}")
+    
+    # 没有srcset描述符的候选按来源排序：已知的懒加载属性中通常是真实地址，src可能是占位图；
+    # 其他data-*属性（缩略图、LQIP占位图等）排在src之后
+    SOURCE_PRIORITY = {'data-original': 0, 'data-src': 1, 'data-lazy-src': 1, 'src': 3}
+    OTHER_SOURCE_PRIORITY = 4
+    
+    def _rank_variants(self, variants):
+        """把同一元素的候选图片按优先顺序排列：分辨率最高（或最接近srcset_density）的在前
+        
+        w描述符直接比较宽度，x描述符按 x * 渲染宽度 换算成宽度；没有描述符但浏览器
+        已加载的候选（URL就是currentSrc）按自然宽度参与比较，例如比srcset各尺寸更大的原图src。
+        其余没有描述符的候选排在最后，按SOURCE_PRIORITY排序。
+        """
+        rendered = max((v.get('rw') or 0 for v in variants), default=0)
+        
+        def width(variant):
+            if variant.get('w'):
+                return variant['w']
+            if variant.get('x'):
+                return variant['x'] * (rendered or 1000)
+            if variant.get('complete') and variant.get('nw') and variant.get('current') == variant['url']:
+                return variant['nw']
+            return None
+        
+        described = sorted((v for v in variants if width(v)), key=width, reverse=True)
+        plain = sorted((v for v in variants if not width(v)),
+                       key=lambda v: self.SOURCE_PRIORITY.get(v['source'], self.OTHER_SOURCE_PRIORITY))
+        
+        if described and self.srcset_density:
+            # 选择不小于目标宽度的最小候选，都小于目标时选最大的
+            target = self.srcset_density * (rendered or 1000)
+            enough = [v for v in described if width(v) >= target]
+            if enough:
+                chosen = enough[-1]
+                described.remove(chosen)
+                described.insert(0, chosen)
+        
+        return described + plain
+    
+    def _candidate_urls(self, candidates):
+        """把候选图片按元素分组、过滤并去重，保持页面顺序
+        
+        同一个img/picture的多个候选（srcset各尺寸、懒加载属性等）合并为一张图片，
+        只返回首选的URL，其余按优先顺序记录在self.fallback_urls中，验证或下载失败时依次尝试。
+        """
+        groups = OrderedDict()
+        denied = 0
+        for position, candidate in enumerate(candidates):
+            if not self.is_valid_image_url(candidate['url']):
+                continue
+            if self._is_denied(candidate['url']):
+                denied += 1
+                continue
+            group = candidate.get('group')
+            key = ('group', group) if group is not None else ('single', position)
+            groups.setdefault(key, []).append(candidate)
+        
+        image_urls = []
+        self.fallback_urls = {}
+        seen_urls = set()
+        too_small = 0
+        
+        for variants in groups.values():
+            ranked = []
+            for variant in self._rank_variants(variants):
+                if variant['url'] not in ranked:
+                    ranked.append(variant['url'])
+            if self._is_too_small(ranked[0], variants):
+                too_small += 1
+                continue
+            if ranked[0] in seen_urls:
+                continue
+            seen_urls.add(ranked[0])
+            image_urls.append(ranked[0])
+            if len(ranked) > 1:
+                self.fallback_urls[ranked[0]] = ranked[1:]
+        
+        skipped = sum(len(urls) for urls in self.fallback_urls.values())
+        if skipped:
+            self.metrics.incr('images.variants_skipped', skipped)
+        if denied:
+            self.metrics.incr('images.prefiltered.pattern', denied)
+        if too_small:
+            self.metrics.incr('images.prefiltered.size', too_small)
+        if denied or too_small:
+            logger.info(f"预过滤丢弃 {too_small} 张小图片、{denied} 个匹配排除规则的URL")
+        return image_urls
+    
+    # 默认排除的URL：网站图标、表情、头像、追踪像素、雪碧图和常见统计/广告域名
+    DEFAULT_DENY_PATTERNS = (
+        r'favicon', r'apple-touch-icon', r'/emoji', r'/emoticons?/', r'/icons?/', r'/avatars?/',
+        r'/(spacer|blank|pixel|transparent|1x1)\.(gif|png)', r'/sprites?[/.]',
+        r'//[^/]*(doubleclick\.net|google-analytics\.com|googletagmanager\.com|facebook\.com/tr)',
+    )
+    
+    def _is_denied(self, url):
+        """URL是否匹配deny_patterns中的排除规则"""
+        return any(pattern.search(url) for pattern in self.deny_patterns)
+    
+    def _is_too_small(self, url, variants):
+        """根据页面报告的尺寸判断图片是否小于阈值，尺寸未知时返回False
+        
+        自然尺寸只有在图片已加载且当前显示的就是首选URL时才可信（懒加载占位图的
+        自然尺寸与真实图片无关）；没有其他候选的图片尚未加载时改用渲染尺寸。
+        加载失败或被屏蔽的图片（complete但自然宽度为0）尺寸未知。
+        """
+        min_width, min_height = self._dom_thresholds
+        if not (min_width or min_height):
+            return False
+        
+        info = variants[0]
+        if info.get('complete') and info.get('nw') and info.get('current') == url:
+            width, height = info['nw'], info.get('nh') or 0
+        elif len(variants) == 1 and not info.get('complete') and info.get('rw') and info.get('rh'):
+            width, height = info['rw'], info['rh']
+        else:
+            return False
+        return width < min_width or height < min_height
+    
+    # 反爬验证页面的特征文本
+    CHALLENGE_MARKERS = (
+        'cf-browser-verification', 'challenge-platform', '/cdn-cgi/challenge', 'cf_chl_',
+        'Just a moment...', 'Attention Required!', 'ddos-guard', 'g-recaptcha', 'h-captcha',
+        'Please enable JavaScript', 'enable JavaScript and cookies',
+    )
+    
+    def collect_static_image_urls(self, url, timeout=15):
+        """直接请求页面HTML并解析候选图片，不启动浏览器
+        
+        返回图片URL列表；遇到403/429/503、验证页面、非HTML响应或（auto模式下）图片少于
+        static_min_images张时返回None，由调用方改用浏览器。
+        """
+        logger.info(f"正在直接请求页面: {url}")
+        
+        with self.metrics.phase('static_fetch'):
+            try:
+                # 会话默认请求头就是浏览器访问页面时的请求头；被限流时直接改用浏览器
+                response = self._http('GET', url, throttle_retries=0, timeout=timeout)
+            except requests.RequestException as e:
+                return self._escalate('error', f"请求页面失败: {e}")
+            
+            with response:
+                if response.status_code in (403, 429, 503):
+                    return self._escalate('blocked', f"HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    raise Exception(f"页面请求失败: HTTP {response.status_code}")
+                if 'html' not in response.headers.get('Content-Type', 'text/html').lower():
+                    return self._escalate('not_html', "响应不是HTML")
+                html = decode_html(response)
+                page_url = response.url
+            
+            if any(marker in html for marker in self.CHALLENGE_MARKERS):
+                return self._escalate('challenge', "检测到验证页面")
+            
+            parser = StaticImageParser(page_url)
+            parser.feed(html)
+            image_urls = self._candidate_urls(parser.close())
+        
+        # 只解析HTML时不要求最少图片数
+        if self.fetch_mode != 'static' and len(image_urls) < self.static_min_images:
+            return self._escalate('too_few', f"只找到 {len(image_urls)} 张图片")
+        
+        # 不使用浏览器：释放上一个页面的浏览器，避免refresh_context读到旧页面
+        if self.driver:
+            self.close()
+        self.network_images = {}
+        self._network_requests = {}
+        self.context = RequestContext(
+            cookies=self.session.cookies.get_dict(),
+            user_agent=self.session.headers.get('User-Agent', DEFAULT_USER_AGENT),
+            referer=page_url,
+            page_url=page_url,
+        )
+        self.metrics.incr('static.pages')
+        return image_urls
+    
+    def _escalate(self, reason, message):
+        """记录静态抓取失败的原因，返回None表示需要改用浏览器"""
+        self.metrics.incr(f'static.escalate.{reason}')
+        if self.fetch_mode == 'static':
+            logger.warning(f"静态抓取失败: {message}")
+        else:
+            logger.info(f"静态抓取不可用（{message}），改用浏览器")
+        return None
+    
+    def collect_browser_image_urls(self, url):
+        """用浏览器打开页面、滚动触发懒加载并收集候选图片URL"""
+        if not self.driver and not self.create_driver(self.headless):
+            raise Exception("无法启动浏览器，请确保已安装Chrome和ChromeDriver")
+        
+        logger.info(f"正在访问: {url}")
+        
+        # 访问页面
+        self._background_urls = []
+        self._background_seen = set()
+        if self.capture_network or self.reuse_browser_bodies:
+            # 丢弃上一个页面遗留的网络日志
+            self.collect_network_images()
+            self.network_images = {}
+            self._network_requests = {}
+        with self.metrics.phase('page_get'):
             self.driver.get(url)
+        if self.driver_pool:
+            self.driver_pool.note_page(self.driver.wrapped_driver)
+        
+        # 等待页面加载
+        if not self.wait_for_page_load():
+            raise Exception("页面加载失败")
+        
+        logger.info("页面加载完成，开始提取图片...")
+        
+        extract_started = time.perf_counter()
+        
+        # 页面加载后快照一次请求上下文，后续验证、下载和预览共用
+        self.refresh_context(force=True)
+        
+        # 一次execute_script收集所有候选图片（已按页面顺序排列并转换为绝对URL）
+        candidates = self.harvest_image_candidates()
+        
+        if self.capture_network or self.reuse_browser_bodies:
+            self.collect_network_images()
+            logger.info(f"浏览器网络日志中记录了 {len(self.network_images)} 张图片")
+        
+        # 背景图片来自滚动期间的增量收集，放在最后
+        self._add_background_urls(c['url'] for c in candidates if c['source'] == 'background')
+        candidates = [c for c in candidates if c['source'] != 'background']
+        candidates.extend({'url': bg_url, 'source': 'background'} for bg_url in self._background_urls)
+        
+        # 收集所有图片URL，保持顺序
+        image_urls = self._candidate_urls(candidates)
+        self.metrics.observe('extract', time.perf_counter() - extract_started)
+        return image_urls
+    
+    def harvest_image_candidates(self):
+        """在一次WebDriver调用中收集页面上所有候选图片
+        
+        按页面顺序返回 [{'url': 绝对URL, 'source': 来源}, ...]，来源包括
+        img的src、data-*懒加载属性、srcset、<picture><source>，以及背景图片收集器中
+        尚未读取的CSS背景图片（放在最后）。同一个img的候选带有相同的group，
+        srcset中的候选带有宽度w或像素密度x描述符，rw/rh为img的渲染尺寸，
+        nw/nh为自然尺寸，complete为是否已加载，current为当前显示的URL（currentSrc）。
+        srcset在页面中只取原始字符串，由parse_srcset统一解析（与静态抓取共用同一个解析器）。
+        """
+        script = """
+        var results = [];
+        var group = 0, renderedWidth = 0, dom = {};
+        
+        function absolute(url) {
+            try {
+                return new URL(url, document.baseURI).href;
+            } catch (e) {
+                return null;
+            }
+        }
+        
+        function candidate(source) {
+            return {source: source, group: group, w: null, x: null, rw: renderedWidth || null,
+                    rh: dom.rh, nw: dom.nw, nh: dom.nh, complete: dom.complete, current: dom.current};
+        }
+        
+        function add(url, source) {
+            if (!url) return;
+            url = url.trim();
+            if (!url || url.indexOf('data:') === 0) return;
+            var abs = absolute(url);
+            if (!abs) return;
+            var item = candidate(source);
+            item.url = abs;
+            results.push(item);
+        }
+        
+        function addSrcset(srcset, source) {
+            if (!srcset || !srcset.trim()) return;
+            var item = candidate(source);
+            item.srcset = srcset;
+            item.base = document.baseURI;
+            results.push(item);
+        }
+        
+        function looksLikeUrl(value) {
+            return /^(https?:)?\\/\\//i.test(value) || value.charAt(0) === '/' ||
+                /\\.(jpe?g|png|gif|webp|bmp|svg|avif)(\\?|#|$)/i.test(value);
+        }
+        
+        var imgs = document.getElementsByTagName('img');
+        for (var i = 0; i < imgs.length; i++) {
+            var img = imgs[i];
+            group = i + 1;
+            renderedWidth = img.clientWidth || img.width || 0;
+            // 页面报告的尺寸：自然尺寸只对当前显示的currentSrc有效
+            dom = {rh: img.clientHeight || img.height || null,
+                   nw: img.naturalWidth || null, nh: img.naturalHeight || null,
+                   complete: img.complete, current: img.currentSrc || img.src || null};
+            
+            add(img.getAttribute('src') ? img.src : null, 'src');
+            add(img.getAttribute('data-src'), 'data-src');
+            add(img.getAttribute('data-original'), 'data-original');
+            
+            // 其他data-*懒加载属性
+            for (var j = 0; j < img.attributes.length; j++) {
+                var attr = img.attributes[j];
+                var name = attr.name;
+                if (name.indexOf('data-') !== 0 || name === 'data-src' || name === 'data-original') continue;
+                if (name.indexOf('srcset') !== -1) {
+                    addSrcset(attr.value, name);
+                } else if (looksLikeUrl(attr.value)) {
+                    add(attr.value, name);
+                }
+            }
             
-            # 等待页面加载
-            if not self.wait_for_page_load():
-                raise Exception("页面加载失败")
-            
-            print("页面加载完成，开始提取图片...")
-            
-            # 获取所有图片元素
-            img_elements = self.driver.find_elements(By.TAG_NAME, "img")
-            
-            # 获取CSS背景图片
-            bg_images = self.extract_background_images()
-            
-            # 收集所有图片URL
-            # 收集所有图片URL，保持顺序
-            image_urls = []
-            seen_urls = set()
-            
-            # 处理img标签，按在页面中的顺序
-            for img in img_elements:
-                # 获取src属性
-                src = img.get_attribute('src')
-                if src and self.is_valid_image_url(src) and src not in seen_urls:
-                    image_urls.append(src)
-                    seen_urls.add(src)
-                
-                # 获取data-src属性（懒加载）
-                data_src = img.get_attribute('data-src')
-                if data_src and self.is_valid_image_url(data_src) and data_src not in seen_urls:
-                    image_urls.append(data_src)
-                    seen_urls.add(data_src)
-                
-                # 获取data-original属性
-                data_original = img.get_attribute('data-original')
-                if data_original and self.is_valid_image_url(data_original) and data_original not in seen_urls:
-                    image_urls.append(data_original)
-                    seen_urls.add(data_original)
-            
-            # 添加背景图片（放在最后）
-            for bg_url in bg_images:
-                if bg_url not in seen_urls:
-                    image_urls.append(bg_url)
-                    seen_urls.add(bg_url)
-            
-            print(f"找到 {len(image_urls)} 个图片URL")
-            
-            # 验证图片并获取详细信息
-            valid_images = []
-            min_size_bytes = min_size_kb * 1024
-            
-            for i, img_url in enumerate(image_urls):
-                try:
-                    print(f"验证图片 {i+1}/{len(image_urls)}: {img_url[:50]}...")
-                    
-                    # 获取图片信息
-                    img_info = self.get_image_info(img_url)
-                    
-                    if img_info and img_info['size'] >= min_size_bytes:
-                        valid_images.append(img_info)
-                        print(f"✓ 有效图片: {img_info['filename']} ({img_info['size']/1024:.1f}KB)")
-                    
-                except Exception as e:
-                    print(f"✗ 验证失败: {e}")
-                    continue
-            
-            # 按大小排序
-            # 保持原始顺序，不按大小排序
-            
-            print(f"嗅探完成，找到 {len(valid_images)} 张有效图片")
-            return valid_images
+            addSrcset(img.getAttribute('srcset'), 'srcset');
             
+            // <picture>中的<source>
+            var parent = img.parentElement;
+            if (parent && parent.tagName === 'PICTURE') {
+                var sources = parent.getElementsByTagName('source');
+                for (var k = 0; k < sources.length; k++) {
+                    addSrcset(sources[k].getAttribute('srcset') || sources[k].getAttribute('data-srcset'), 'picture');
+                }
+            }
+        }
+        
+        // CSS背景图片：完整重新扫描一次（DOM就绪后才生效的样式），再取出尚未读取的部分
+        var collector = window.__imageSnifferBg;
+        if (collector) {
+            collector.rescan();
+            var bgUrls = collector.drain();
+            for (var i = 0; i < bgUrls.length; i++) {
+                results.push({url: bgUrls[i], source: 'background'});
+            }
+        }
+        
+        return results;
+        """
+        
+        try:
+            raw = self.driver.execute_script(script) or []
         except Exception as e:
-            print(f"提取图片失败: {e}")
+            logger.warning(f"收集页面图片失败: {e}")
             return []
+        
+        # 展开srcset：每个候选URL继承所属img的分组和尺寸信息
+        candidates = []
+        for item in raw:
+            srcset = item.pop('srcset', None)
+            if srcset is None:
+                candidates.append(item)
+                continue
+            base = item.pop('base', None) or self.driver.current_url
+            for url, width, density in parse_srcset(srcset):
+                if url.startswith('data:'):
+                    continue
+                candidates.append(dict(item, url=urljoin(base, url), w=width, x=density))
+        return candidates
     
-    def extract_background_images(self):
-        """提取CSS背景图片"""
-        bg_images = set()
+    def install_background_collector(self):
+        """注入CSS背景图片收集器
         
-        try:
-            # 执行JavaScript获取所有背景图片
-            script = """
-            var bgImages = [];
-            var elements = document.querySelectorAll('*');
-            
+        页面DOM就绪后扫描一次现有元素，之后通过MutationObserver检查新增的节点和
+        style/class变化的节点（包括其子节点），样式表加载完成时重新扫描整个页面；
+        收集候选图片时还会再完整扫描一次，DOM就绪之后才生效的样式规则也不会遗漏。
+        URL在页面内用Set去重后放入队列，由drain_background_images增量取回。
+        虚拟列表中已被移除的节点也不会遗漏。
+        """
+        script = """
+        if (window.__imageSnifferBg) return true;
+        
+        var collector = {seen: new Set(), queue: []};
+        var pattern = /url\\(['"]?([^'"\\)]+)['"]?\\)/g;
+        
+        function inspect(el) {
+            var bgImage = window.getComputedStyle(el).backgroundImage;
+            if (!bgImage || bgImage === 'none' || bgImage.indexOf('url(') === -1) return;
+            
+            var match;
+            pattern.lastIndex = 0;
+            while ((match = pattern.exec(bgImage)) !== null) {
+                var url;
+                try {
+                    url = new URL(match[1], document.baseURI).href;
+                } catch (e) {
+                    continue;
+                }
+                if (url.indexOf('data:') === 0 || collector.seen.has(url)) continue;
+                collector.seen.add(url);
+                collector.queue.push(url);
+            }
+        }
+        
+        function scan(root) {
+            if (root.nodeType !== 1) return;
+            inspect(root);
+            var elements = root.getElementsByTagName('*');
             for (var i = 0; i < elements.length; i++) {
-                var style = window.getComputedStyle(elements[i]);
-                var bgImage = style.backgroundImage;
-                
-                if (bgImage && bgImage !== 'none') {
-                    var matches = bgImage.match(/url\\(['"]?([^'"\\)]+)['"]?\\)/g);
-                    if (matches) {
-                        for (var j = 0; j < matches.length; j++) {
-                            var url = matches[j].replace(/url\\(['"]?/, '').replace(/['"]?\\)$/, '');
-                            bgImages.push(url);
-                        }
+                inspect(elements[i]);
+            }
+        }
+        
+        collector.drain = function () {
+            var queue = collector.queue;
+            collector.queue = [];
+            return queue;
+        };
+        
+        collector.observer = new MutationObserver(function (mutations) {
+            for (var i = 0; i < mutations.length; i++) {
+                var mutation = mutations[i];
+                if (mutation.type === 'childList') {
+                    for (var j = 0; j < mutation.addedNodes.length; j++) {
+                        scan(mutation.addedNodes[j]);
                     }
+                } else {
+                    // class变化可能让子节点匹配新的样式规则
+                    scan(mutation.target);
                 }
             }
-            
-            return bgImages;
-            """
-            
-            urls = self.driver.execute_script(script)
-            
-            for url in urls:
-                if self.is_valid_image_url(url):
-                    # 转换为绝对URL
-                    absolute_url = urljoin(self.driver.current_url, url)
-                    bg_images.add(absolute_url)
-            
+        });
+        
+        collector.rescan = function () {
+            scan(document.documentElement);
+        };
+        
+        // 异步或延迟加载的样式表生效后重新扫描（load事件不冒泡，在捕获阶段监听）
+        var rescanTimer = null;
+        document.addEventListener('load', function (event) {
+            var target = event.target;
+            if (!target || target.tagName !== 'LINK' && target.tagName !== 'STYLE') return;
+            clearTimeout(rescanTimer);
+            rescanTimer = setTimeout(collector.rescan, 50);
+        }, true);
+        
+        scan(document.documentElement);
+        collector.observer.observe(document.documentElement, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: ['style', 'class']
+        });
+        
+        window.__imageSnifferBg = collector;
+        return true;
+        """
+        
+        try:
+            self.driver.execute_script(script)
+            return True
+        except Exception as e:
+            logger.warning(f"注入背景图片收集器失败: {e}")
+            return False
+    
+    def _add_background_urls(self, urls):
+        """记录新发现的背景图片（保持发现顺序并去重）"""
+        for url in urls:
+            if url not in self._background_seen and self.is_valid_image_url(url):
+                self._background_seen.add(url)
+                self._background_urls.append(url)
+    
+    def drain_background_images(self):
+        """取回收集器中新增的背景图片"""
+        try:
+            urls = self.driver.execute_script(
+                "var c = window.__imageSnifferBg; return c ? c.drain() : [];"
+            )
+            self._add_background_urls(urls or [])
         except Exception as e:
-            print(f"提取背景图片失败: {e}")
+            logger.warning(f"读取背景图片失败: {e}")
         
-        return bg_images
+        return self._background_urls
+    
+    def extract_background_images(self):
+        """提取CSS背景图片"""
+        # 收集器已注入时只会取回增量部分；未注入时注入过程会完成一次全量扫描
+        self.install_background_collector()
+        return set(self.drain_background_images())
+    
+    # 路径中的图片扩展名（允许 .jpg!large、.jpg_720x 这类CDN后缀）
+    _IMAGE_PATH_PATTERN = re.compile(r'\.(jpe?g|png|gif|webp|bmp|svg|avif)(?![a-z0-9])', re.I)
+    # 没有扩展名时：图片目录（/images/、/img/）、查询参数中的图片格式（format=webp）或图片文件名
+    _IMAGE_HINT_PATTERN = re.compile(
+        r'/(images?|imgs?|photos?|pics?)/|[?&](format|fm|ext|type)=(jpe?g|png|gif|webp|avif)\b'
+        r'|=[^&#]*\.(jpe?g|png|gif|webp|avif)(?![a-z0-9])', re.I)
     
     def is_valid_image_url(self, url):
         """判断是否为有效的图片URL"""
         if not url or url.startswith('data:'):
             return False
         
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.svg']
-        url_lower = url.lower()
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            return False
+        
+        return bool(self._IMAGE_PATH_PATTERN.search(parsed.path)
+                    or self._IMAGE_HINT_PATTERN.search(url))
+    
+    def _http(self, method, url, throttle_retries=None, **kwargs):
+        """发送HTTP请求（经过按主机的调度器，被限流时等待后自动重试）"""
+        host = urlparse(url).netloc
+        if throttle_retries is None:
+            throttle_retries = self.throttle_retries
+        for attempt in range(throttle_retries + 1):
+            self.scheduler.acquire(host)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except Exception:
+                self.scheduler.release(host)
+                raise
+            
+            length = response.headers.get('Content-Length', '')
+            nbytes = int(length) if method != 'HEAD' and length.isdigit() else 0
+            throttled = self.scheduler.release(host, response.status_code, response.headers, nbytes)
+            if not throttled:
+                return response
+            self.metrics.incr('http.throttled')
+            if attempt >= throttle_retries:
+                return response
+            # 调度器会让该主机的下一个请求等待Retry-After或退避时间
+            response.close()
+            self.metrics.incr('http.throttle_retries')
+            logger.debug(f"请求被限流（HTTP {response.status_code}），稍后重试: {url}")
+    
+    def host_stats(self):
+        """各主机的请求吞吐和限流统计"""
+        return self.scheduler.stats()
+    
+    def refresh_context(self, force=False):
+        """刷新请求上下文快照
+        
+        只有页面跳转或document.cookie变化时才重新读取完整cookies，
+        否则直接复用上一次的快照。必须在持有driver的线程中调用。
+        """
+        if not self.driver:
+            return self.context
+        
+        try:
+            state = self.driver.execute_script(
+                "return [navigator.userAgent, location.href, document.cookie];"
+            )
+            user_agent, page_url, document_cookie = state
+            
+            if force or self.context.is_stale(page_url, document_cookie):
+                cookies = self.driver.get_cookies()
+                self.context = RequestContext(
+                    cookies={cookie['name']: cookie['value'] for cookie in cookies},
+                    user_agent=user_agent,
+                    referer=page_url,
+                    page_url=page_url,
+                    document_cookie=document_cookie,
+                )
+        except Exception as e:
+            logger.warning(f"读取浏览器上下文失败，使用上一次的快照: {e}")
+        
+        return self.context
+    
+    def collect_network_images(self):
+        """从Chrome性能日志中读取图片响应（URL、状态码、MIME类型、大小）
+        
+        get_log会清空浏览器端的日志缓冲，因此在滚动过程中需要持续调用。
+        """
+        try:
+            entries = self.driver.get_log('performance')
+        except Exception as e:
+            logger.warning(f"读取网络日志失败: {e}")
+            return self.network_images
+        
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            
+            method = message.get('method')
+            params = message.get('params', {})
+            request_id = params.get('requestId')
+            
+            if method == 'Network.requestWillBeSent':
+                # 重定向时同一个requestId会出现多次，记录所有URL
+                record = self._network_requests.setdefault(request_id, {'urls': [], 'response': None})
+                record['urls'].append(params['request']['url'])
+            
+            elif method == 'Network.responseReceived':
+                response = params.get('response', {})
+                mime_type = response.get('mimeType', '')
+                if params.get('type') != 'Image' and not mime_type.startswith('image/'):
+                    self._network_requests.pop(request_id, None)
+                    continue
+                record = self._network_requests.setdefault(request_id, {'urls': [], 'response': None})
+                record['urls'].append(response.get('url'))
+                record['response'] = response
+            
+            elif method == 'Network.loadingFinished':
+                record = self._network_requests.pop(request_id, None)
+                if not record or not record['response']:
+                    continue
+                response = record['response']
+                headers = {k.lower(): v for k, v in response.get('headers', {}).items()}
+                
+                size = int(headers.get('content-length', 0) or 0)
+                if not size:
+                    # 没有Content-Length时，用总接收字节数减去响应头部分
+                    size = max(0, int(params.get('encodedDataLength', 0)) - int(response.get('encodedDataLength', 0)))
+                
+                info = {
+                    'status': response.get('status'),
+                    'content_type': response.get('mimeType', ''),
+                    'size': size,
+                    'request_id': request_id,
+                }
+                for url in record['urls']:
+                    if url:
+                        self.network_images[url] = info
+            
+            elif method == 'Network.loadingFailed':
+                self._network_requests.pop(request_id, None)
+        
+        return self.network_images
+    
+    def get_browser_body(self, url):
+        """通过CDP Network.getResponseBody取回浏览器已下载的图片数据
+        
+        浏览器未加载过该图片、已关闭或数据已被清出缓冲区时返回None。
+        """
+        info = self.network_images.get(url)
+        if not info or info['status'] not in (200, 206) or not self.driver:
+            return None
+        
+        try:
+            with self._driver_lock:
+                result = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': info['request_id']})
+        except Exception:
+            return None
+        
+        self.metrics.incr('browser_body.hits')
+        body = result.get('body', '')
+        if result.get('base64Encoded'):
+            return base64.b64decode(body)
+        return body.encode('utf-8')
+    
+    def fetch_image_bytes(self, url, context=None, timeout=10):
+        """获取完整的图片数据，优先使用浏览器已下载的数据，其次使用磁盘缓存"""
+        if self.reuse_browser_bodies:
+            body = self.get_browser_body(url)
+            if body is not None:
+                if self.cache and not self.cache.get(url):
+                    self.cache.store(url, body)
+                return body
+        
+        if self.cache:
+            return self._cached_get(url, context, timeout)
+        
+        context = context or self.context
+        response = self._http('GET', url, headers=context.headers(), cookies=context.cookies, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+    
+    def _cached_get(self, url, context=None, timeout=10):
+        """经过磁盘缓存的GET请求：新鲜的缓存直接返回，过期的用条件请求确认"""
+        context = context or self.context
+        entry = self.cache.get(url)
+        
+        if entry and self.cache.is_fresh(entry):
+            data = self.cache.read(url, entry)
+            if data is not None:
+                self._record_cache(True)
+                return data
+            entry = None
+        
+        headers = context.headers()
+        if entry:
+            headers.update(self.cache.conditional_headers(entry))
+        
+        response = self._http('GET', url, headers=headers, cookies=context.cookies, timeout=timeout)
+        
+        if entry and response.status_code == 304:
+            self.cache.revalidated(url, response.headers)
+            data = self.cache.read(url, entry)
+            if data is not None:
+                self._record_cache(True)
+                return data
+            # 缓存文件丢失，重新完整请求
+            response = self._http('GET', url, headers=context.headers(), cookies=context.cookies, timeout=timeout)
+        
+        response.raise_for_status()
+        self._record_cache(False)
+        self.cache.store(url, response.content, response.headers)
+        return response.content
+    
+    def _cached_body(self, url, context=None, timeout=10):
+        """只在缓存新鲜或服务器返回304时返回缓存的数据，否则返回None（不下载完整内容）
+        
+        下载时未命中缓存的图片改为流式写入.part文件（可续传），完成后再存入缓存。
+        """
+        context = context or self.context
+        entry = self.cache.get(url)
+        if not entry:
+            return None
+        
+        if self.cache.is_fresh(entry):
+            data = self.cache.read(url, entry)
+            if data is not None:
+                self._record_cache(True)
+            return data
+        
+        headers = dict(context.headers(), **self.cache.conditional_headers(entry))
+        with self._http('GET', url, headers=headers, cookies=context.cookies,
+                        stream=True, timeout=timeout) as response:
+            if response.status_code != 304:
+                return None
+            self.cache.revalidated(url, response.headers)
+        data = self.cache.read(url, entry)
+        if data is not None:
+            self._record_cache(True)
+        return data
+    
+    def validate_images(self, image_urls, min_size_kb=10, min_width=0, min_height=0):
+        """并发验证图片，结果保持页面中的原始顺序"""
+        return list(self.iter_validated_images(image_urls, min_size_kb, min_width, min_height))
+    
+    def iter_validated_images(self, image_urls, min_size_kb=10, min_width=0, min_height=0, fallbacks=None):
+        """并发验证图片（生成器），按页面顺序逐个返回通过过滤的图片
+        
+        设置了min_width/min_height时会解析图片尺寸，尺寸未知的图片不按尺寸过滤。
+        fallbacks为 {URL: [备选URL, ...]}，首选URL验证失败或未通过大小/尺寸过滤时依次验证备选URL，
+        返回的图片信息中 'fallbacks' 为剩余的备选URL，供下载失败时使用。
+        """
+        fallbacks = fallbacks or {}
+        min_size_bytes = min_size_kb * 1024
+        total = len(image_urls)
+        need_dimensions = bool(min_width or min_height)
+        
+        def large_enough(img_info):
+            if img_info['size'] < min_size_bytes:
+                return False
+            if img_info.get('width') is not None and img_info['width'] < min_width:
+                return False
+            if img_info.get('height') is not None and img_info['height'] < min_height:
+                return False
+            return True
+        
+        # WebDriver不是线程安全的，在当前线程中读取一次上下文快照供所有工作线程共享
+        context = self.refresh_context()
+        
+        def validate(item):
+            i, img_url = item
+            urls = [img_url] + list(fallbacks.get(img_url, ()))
+            try:
+                for position, url in enumerate(urls):
+                    logger.debug(f"验证图片 {i+1}/{total}: {url[:50]}...")
+                    img_info = self.get_image_info(url, context, need_dimensions)
+                    if img_info and large_enough(img_info):
+                        if position:
+                            self.metrics.incr('images.fallback_used')
+                        img_info['fallbacks'] = urls[position + 1:]
+                        return img_info
+                return None
+            except Exception as e:
+                logger.warning(f"✗ 验证失败: {e}")
+                return None
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            # map按提交顺序返回结果，保证与DOM顺序一致；前面的图片验证完就能立即返回
+            for img_info in executor.map(validate, enumerate(image_urls)):
+                if img_info:
+                    logger.info(f"✓ 有效图片: {img_info['filename']} ({img_info['size']/1024:.1f}KB)")
+                    yield img_info
+        finally:
+            # 调用方提前停止迭代时取消尚未开始的验证
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def probe_image(self, url, context=None, probe_bytes=None):
+        """用Range请求只读取图片开头部分，获取总大小、类型和像素尺寸
+        
+        服务器支持Range时从Content-Range读取总大小；不支持时从Content-Length读取，
+        两者都没有时最多读取1MB估算大小。返回 (大小, Content-Type, 尺寸或None)。
+        """
+        context = context or self.context
+        probe_bytes = probe_bytes or self.PROBE_BYTES
+        headers = dict(context.headers(), Range=f'bytes=0-{probe_bytes - 1}')
+        
+        with self._http('GET', url, headers=headers, cookies=context.cookies, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '')
+            
+            head = b''
+            for chunk in response.iter_content(8192):
+                head += chunk
+                if len(head) >= probe_bytes:
+                    break
+            
+            size = 0
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1].strip()
+                if total.isdigit():
+                    size = int(total)
+            elif response.headers.get('Content-Length'):
+                size = int(response.headers['Content-Length'])
+            
+            if not size:
+                # 没有任何长度信息，继续读取估算大小（限制1MB）
+                size = len(head)
+                if response.status_code != 206:
+                    for chunk in response.iter_content(8192):
+                        size += len(chunk)
+                        if size > 1024 * 1024:
+                            break
+        
+        return size, content_type, parse_image_dimensions(head)
+    
+    def _image_info(self, url, size, content_type, dimensions=None):
+        """组装图片信息字典"""
+        width, height = dimensions or (None, None)
+        return {
+            'url': url,
+            'filename': self.extract_filename(url),
+            'size': size,
+            'content_type': content_type,
+            'width': width,
+            'height': height,
+        }
+    
+    def get_image_info(self, url, context=None, need_dimensions=False):
+        """获取图片详细信息
         
-        return any(ext in url_lower for ext in image_extensions) or 'image' in url_lower
+        need_dimensions为True时会尽量解析像素尺寸（width/height），
+        否则只在HEAD没有返回大小时才发送Range探测请求。
+        """
+        with self.metrics.phase('get_image_info'):
+            return self._get_image_info(url, context, need_dimensions)
     
-    def get_image_info(self, url):
-        """获取图片详细信息"""
+    def _get_image_info(self, url, context, need_dimensions):
         try:
-            # 使用当前浏览器的cookies
-            cookies = self.driver.get_cookies()
-            cookie_dict = {cookie['name']: cookie['value'] for cookie in cookies}
-            
-            # 设置请求头
-            headers = {
-                'User-Agent': self.driver.execute_script("return navigator.userAgent;"),
-                'Referer': self.driver.current_url,
-                'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-            }
-            
-            # 发送HEAD请求获取基本信息
-            response = self.session.head(url, headers=headers, cookies=cookie_dict, timeout=10)
-            
-            if response.status_code != 200:
-                # 如果HEAD失败，尝试GET请求
-                response = self.session.get(url, headers=headers, cookies=cookie_dict, timeout=10, stream=True)
-            
-            content_type = response.headers.get('Content-Type', '')
-            content_length = int(response.headers.get('Content-Length', 0))
-            
-            # 如果没有Content-Length，尝试获取实际大小
-            if content_length == 0 and hasattr(response, 'iter_content'):
-                chunk_size = 8192
-                total_size = 0
-                for chunk in response.iter_content(chunk_size):
-                    total_size += len(chunk)
-                    if total_size > 1024 * 1024:  # 限制1MB
-                        break
-                content_length = total_size
-            
-            # 提取文件名
-            filename = self.extract_filename(url)
-            
-            return {
-                'url': url,
-                'filename': filename,
-                'size': content_length,
-                'content_type': content_type
-            }
+            # 浏览器已经加载过的图片直接使用网络日志中的信息
+            network_info = self.network_images.get(url)
+            if network_info:
+                status = network_info['status']
+                if status in (200, 206) and network_info['size'] > 0:
+                    dimensions = None
+                    if need_dimensions and self.reuse_browser_bodies:
+                        body = self.get_browser_body(url)
+                        dimensions = parse_image_dimensions(body[:self.PROBE_BYTES]) if body else None
+                    self.metrics.incr('network_log.hits')
+                    return self._image_info(url, network_info['size'], network_info['content_type'], dimensions)
+                if status and status >= 400:
+                    self.metrics.incr('validate.failures')
+                    logger.warning(f"浏览器加载图片失败 {url}: HTTP {status}")
+                    return None
+            
+            context = context or self.context
+            headers = context.headers()
+            cookies = context.cookies
+            
+            # 缓存中已有的图片：新鲜时直接使用，否则发送条件请求，304时无需传输数据
+            entry = self.cache.get(url) if self.cache else None
+            if entry:
+                if not self.cache.is_fresh(entry):
+                    with self._http('GET', url, headers=dict(headers, **self.cache.conditional_headers(entry)),
+                                    cookies=cookies, timeout=10) as response:
+                        if response.status_code == 304:
+                            self.cache.revalidated(url, response.headers)
+                        elif response.status_code == 200:
+                            self.cache.store(url, response.content, response.headers)
+                            entry = self.cache.get(url)
+                        else:
+                            entry = None
+                if entry:
+                    self._record_cache(True)
+                    dimensions = None
+                    if need_dimensions:
+                        data = self.cache.read(url, entry)
+                        dimensions = parse_image_dimensions(data[:self.PROBE_BYTES]) if data else None
+                    return self._image_info(url, entry['size'], entry['content_type'], dimensions)
+            if self.cache:
+                self._record_cache(False)
+            
+            if not need_dimensions:
+                # 先发送HEAD请求获取基本信息
+                with self._http('HEAD', url, headers=headers, cookies=cookies, timeout=10) as response:
+                    content_length = int(response.headers.get('Content-Length', 0) or 0)
+                    if response.status_code == 200 and content_length:
+                        return self._image_info(url, content_length, response.headers.get('Content-Type', ''))
+            
+            # HEAD失败、没有大小或需要尺寸时，用Range请求读取文件开头
+            size, content_type, dimensions = self.probe_image(url, context)
+            return self._image_info(url, size, content_type, dimensions)
             
         except Exception as e:
-            print(f"获取图片信息失败 {url}: {e}")
+            self.metrics.incr('validate.failures')
+            logger.warning(f"获取图片信息失败 {url}: {e}")
             return None
     
     def extract_filename(self, url):
@@ -339,42 +2597,47 @@ class SeleniumImageSniffer:
         except:
             return f"image_{hash(url) % 10000}.jpg"
     
-    def download_image(self, img_info, save_dir, index=None):
-        """下载单张图片"""
-        try:
-            # 使用浏览器的cookies（如果浏览器还在运行）
-            cookies = {}
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                'Accept-Language': 'ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7,zh-CN;q=0.6,zh;q=0.5',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-            }
-            
-            if self.driver:
+    def download_image(self, img_info, save_dir, index=None, context=None, progress_callback=None,
+                       deduplicator=None, manifest=None):
+        """下载单张图片
+        
+        progress_callback(已写入字节数, 总字节数) 在每个数据块写入后调用，
+        总字节数未知时为0。传入deduplicator时，重复的图片会被删除并返回已保留文件的路径。
+        传入manifest（DownloadManifest）时，清单中已完成的图片直接跳过，
+        上次中断留下的.part文件用Range请求续传。数据先写入.part文件，完成后再原子改名。
+        img_info中有 'fallbacks' 时，首选URL被拒绝后依次下载备选URL。
+        """
+        with self.metrics.phase('download_image'):
+            # 首选URL被拒绝（如404/403）时，依次尝试同一元素的其他尺寸
+            fallbacks = img_info.get('fallbacks') or []
+            for position, url in enumerate([img_info['url']] + fallbacks):
+                info = img_info if not position else dict(
+                    img_info, url=url, filename=self.extract_filename(url), fallbacks=fallbacks[position:])
                 try:
-                    cookies_list = self.driver.get_cookies()
-                    cookies = {cookie['name']: cookie['value'] for cookie in cookies_list}
-                    headers['User-Agent'] = self.driver.execute_script("return navigator.userAgent;")
-                    headers['Referer'] = self.driver.current_url
-                except:
-                    # 浏览器已关闭，使用默认设置
-                    pass
-            
-            response = self.session.get(
-                img_info['url'], 
-                headers=headers, 
-                cookies=cookies, 
-                stream=True, 
-                timeout=30
-            )
-            response.raise_for_status()
+                    return self._download_image(info, save_dir, index, context, progress_callback,
+                                                deduplicator, manifest)
+                except Exception as e:
+                    if position == len(fallbacks) or not self._is_refusal(e):
+                        raise
+                    self.metrics.incr('download.fallback_used')
+                    logger.info(f"下载失败，改用备选地址 {fallbacks[position]}: {e}")
+    
+    @staticmethod
+    def _is_refusal(error):
+        """下载错误是否是服务器明确拒绝（重试同一URL不会成功）"""
+        cause = error.__cause__
+        return (isinstance(cause, requests.HTTPError) and cause.response is not None
+                and cause.response.status_code in BatchDownloader.NON_RETRYABLE_STATUS)
+    
+    def _download_image(self, img_info, save_dir, index, context, progress_callback, deduplicator, manifest):
+        try:
+            # 使用嗅探时的上下文快照（浏览器关闭后依然有效）
+            context = context or self.context
+            url = img_info['url']
             
             # 确保保存目录存在
             os.makedirs(save_dir, exist_ok=True)
             
-            # 生成文件名（按顺序重命名）
             # 生成文件名（按顺序重命名）
             if index is not None:
                 # 获取文件扩展名
@@ -413,49 +2676,516 @@ class SeleniumImageSniffer:
             
             file_path = os.path.join(save_dir, filename)
             
-            # 如果文件已存在，添加后缀
-            counter = 1
-            base_name, ext = os.path.splitext(file_path)
-            while os.path.exists(file_path):
-                if index is not None:
-                    file_path = f"{base_name}_{counter}{ext}"
-                else:
+            if manifest:
+                # 清单中已完成的图片直接跳过
+                entry = manifest.lookup(index, url)
+                if entry:
+                    existing_path = os.path.join(save_dir, entry['file'])
+                    if deduplicator:
+                        deduplicator.seed(existing_path, entry.get('sha256'), entry['size'])
+                    if progress_callback:
+                        progress_callback(entry['size'], entry['size'])
+                    self.metrics.incr('download.skipped')
+                    return existing_path
+                file_path = manifest.claim_path(file_path, index, url)
+            else:
+                # 如果文件已存在，添加后缀
+                counter = 1
+                base_name, ext = os.path.splitext(file_path)
+                while os.path.exists(file_path):
                     file_path = f"{base_name}_{counter}{ext}"
-                counter += 1
-            
-            # 保存文件
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+                    counter += 1
+            
+            part_path = file_path + '.part'
+            resume_from = 0
+            if manifest and os.path.exists(part_path):
+                resume_from = os.path.getsize(part_path)
+            
+            # 优先使用浏览器已下载的数据或磁盘缓存（新鲜或304），避免重复传输
+            body = self.get_browser_body(url) if self.reuse_browser_bodies else None
+            if body is None and self.cache:
+                body = self._cached_body(url, context, timeout=30)
+            
+            response = None
+            if body is not None:
+                chunks = [body]
+                total_bytes = len(body)
+                resume_from = 0
+            else:
+                headers = context.headers()
+                if resume_from:
+                    headers['Range'] = f'bytes={resume_from}-'
+                response = self._http('GET', url, headers=headers, cookies=context.cookies,
+                                      stream=True, timeout=30)
+                
+                if resume_from and response.status_code == 416:
+                    # 服务器不认可续传范围，重新完整下载
+                    response.close()
+                    resume_from = 0
+                    response = self._http('GET', url, headers=context.headers(), cookies=context.cookies,
+                                          stream=True, timeout=30)
+                
+                response.raise_for_status()
+                if resume_from and response.status_code != 206:
+                    # 服务器不支持Range，从头开始
+                    resume_from = 0
+                chunks = response.iter_content(chunk_size=8192)
+                total_bytes = int(response.headers.get('Content-Length', 0) or 0)
+                if total_bytes:
+                    total_bytes += resume_from
+            
+            # 保存到临时文件，同时计算内容哈希用于去重
+            written = resume_from
+            digest = hashlib.sha256()
+            if resume_from:
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(65536), b''):
+                        digest.update(chunk)
+            
+            with open(part_path, 'ab' if resume_from else 'wb') as f:
+                for chunk in chunks:
                     f.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+                    if progress_callback:
+                        progress_callback(written, total_bytes)
+            
+            os.replace(part_path, file_path)
+            if response is not None and self.cache:
+                # 未命中缓存时流式下载，完成后再存入缓存
+                self._record_cache(False)
+                self.cache.store_file(url, file_path, digest.hexdigest(), response.headers)
+            self.metrics.incr('download.files')
+            self.metrics.incr('download.bytes', written - resume_from)
+            if resume_from:
+                self.metrics.incr('download.resumed')
+            
+            kept_path = file_path
+            sha256 = digest.hexdigest()
+            if deduplicator:
+                on_replace = None
+                if manifest:
+                    # 本文件替换了之前保留的相似文件，清单中指向旧文件的条目一并改为指向本文件
+                    def on_replace(removed, kept):
+                        manifest.redirect(removed, kept, written, sha256)
+                kept_path = deduplicator.register(file_path, sha256, written, on_replace)
+            
+            if manifest:
+                if kept_path == file_path:
+                    manifest.record(index, url, file_path, written, sha256)
+                else:
+                    size, kept_sha256 = deduplicator.kept_info(kept_path) or (written, None)
+                    manifest.record(index, url, kept_path, size, kept_sha256, duplicate=True)
             
-            return file_path
+            return kept_path
             
         except Exception as e:
-            raise Exception(f"下载失败: {e}")
+            raise Exception(f"下载失败: {e}") from e
     
     def close(self):
-        """关闭浏览器"""
-        if self.driver:
+        """关闭浏览器（保留最后一次的请求上下文快照）"""
+        if self.cache:
             try:
-                self.driver.quit()
-            except:
-                pass
+                self.cache.save()
+            except OSError as e:
+                logger.warning(f"保存缓存索引失败: {e}")
+        if self.driver:
+            if self.driver_pool:
+                # 归还到驱动池，由驱动池重置状态或回收
+                self.driver_pool.release(self.driver.wrapped_driver)
+            else:
+                try:
+                    self.driver.quit()
+                except:
+                    pass
             self.driver = None
 
 
+class BatchDownloader:
+    """并行批量下载器，GUI和命令行模式共用
+    
+    文件按列表顺序命名为001.jpg, 002.png...，与download_image(index=...)一致。
+    """
+    
+    # 这些状态码重试也不会成功
+    NON_RETRYABLE_STATUS = {400, 401, 403, 404, 410}
+    
+    def __init__(self, sniffer, max_workers=8, per_host_limit=4, retries=3, backoff=1.0,
+                 deduplicator=None, resume=True, thumbnailer=None):
+        self.sniffer = sniffer
+        self.deduplicator = deduplicator
+        # 可选的下载后处理：ThumbnailGenerator
+        self.thumbnailer = thumbnailer
+        self.resume = resume
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+        # 每个文件的进度事件最短间隔（秒），避免刷屏
+        self.progress_interval = 0.2
+    
+    def _host_semaphore(self, url):
+        """获取URL所属主机的下载并发信号量"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+    
+    def _is_retryable(self, error):
+        """判断下载错误是否值得重试"""
+        cause = error.__cause__
+        if isinstance(cause, requests.HTTPError) and cause.response is not None:
+            return cause.response.status_code not in self.NON_RETRYABLE_STATUS
+        return True
+    
+    def _download_one(self, img_info, save_dir, index, total, context, progress_callback, manifest=None):
+        """下载单个文件（含重试），返回结果字典"""
+        result = {
+            'index': index,
+            'img_info': img_info,
+            'file_path': None,
+            'error': None,
+            'attempts': 0,
+        }
+        
+        def emit(status, **extra):
+            if progress_callback:
+                event = {'status': status, 'index': index, 'total': total,
+                         'filename': img_info['filename']}
+                event.update(extra)
+                progress_callback(event)
+        
+        last_emit = [0.0]
+        
+        def on_progress(written, total_bytes):
+            now = time.time()
+            if now - last_emit[0] >= self.progress_interval:
+                last_emit[0] = now
+                emit('progress', bytes=written, total_bytes=total_bytes)
+        
+        emit('start')
+        
+        for attempt in range(self.retries + 1):
+            result['attempts'] = attempt + 1
+            try:
+                with self._host_semaphore(img_info['url']):
+                    result['file_path'] = self.sniffer.download_image(
+                        img_info, save_dir, index, context=context, progress_callback=on_progress,
+                        deduplicator=self.deduplicator, manifest=manifest
+                    )
+                result['error'] = None
+                emit('done', file_path=result['file_path'])
+                return result
+            except Exception as e:
+                result['error'] = str(e)
+                if attempt >= self.retries or not self._is_retryable(e):
+                    break
+                delay = self.backoff * (2 ** attempt)
+                self.sniffer.metrics.incr('download.retries')
+                emit('retry', error=str(e), attempt=attempt + 1, delay=delay)
+                time.sleep(delay)
+        
+        self.sniffer.metrics.incr('download.failures')
+        emit('failed', error=result['error'])
+        return result
+    
+    def download_all(self, images, save_dir, progress_callback=None):
+        """并行下载全部图片，返回按原顺序排列的结果列表
+        
+        progress_callback(event) 会在工作线程中被调用，event['status'] 取值为
+        start / progress / retry / done / failed；设置了thumbnailer时，下载全部结束后
+        还会收到缩略图阶段的 thumbnail / thumbnail_failed / contact_sheet 事件，
+        每个结果也会带上 'thumbnail'（缩略图路径或None）。
+        """
+        total = len(images)
+        context = self.sniffer.context
+        # 同一目录重复运行时跳过已完成的文件并续传未完成的文件
+        manifest = DownloadManifest(save_dir) if self.resume else None
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._download_one, img_info, save_dir, index, total,
+                                context, progress_callback, manifest)
+                for index, img_info in enumerate(images, 1)
+            ]
+            results = [future.result() for future in futures]
+        
+        if self.deduplicator:
+            # 先下载的文件可能被之后下载的更大版本替换，结果改为指向实际保留的文件
+            for result in results:
+                if result['file_path']:
+                    result['file_path'] = self.deduplicator.resolve(result['file_path'])
+        
+        if self.thumbnailer:
+            files = [(result['index'], result['file_path']) for result in results if result['file_path']]
+            with self.sniffer.metrics.phase('thumbnails'):
+                thumbnails = self.thumbnailer.run(files, save_dir, progress_callback)
+            for result in results:
+                result['thumbnail'] = thumbnails.get(result['index'])
+        
+        return results
+
+
+PREVIEW_SIZE = (550, 400)
+
+
+def make_preview_thumbnail(data, size=PREVIEW_SIZE):
+    """把图片数据解码为预览缩略图，返回 (缩略图, 原始尺寸)
+    
+    JPEG通过draft()让解码器直接按1/2、1/4、1/8缩小解码，其他格式用reduce()
+    先整数倍缩小再做高质量缩放，避免为550x400的预览完整解码大图。
+    """
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    _shrink_image(image, size)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    return image, original_size
+
+
+def _shrink_image(image, size):
+    """按比例把图片缩小到size以内（原地修改），JPEG用draft()，其他格式用reduce()"""
+    if image.format == 'JPEG':
+        image.draft('RGB', size)
+    image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+THUMBNAIL_SIZE = (256, 256)
+
+
+def thumbnail_path_for(file_path):
+    """缩略图与原文件放在一起：001.jpg -> 001_thumb.jpg"""
+    return os.path.splitext(file_path)[0] + '_thumb.jpg'
+
+
+def make_file_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    """为已下载的图片生成JPEG缩略图，返回 (缩略图路径, 耗时秒数)
+    
+    在进程池中执行，因此是模块级函数，参数和返回值都可以pickle。
+    缩略图比原文件新时直接跳过，重复运行不会重新解码。
+    """
+    started = time.perf_counter()
+    thumb_path = thumbnail_path_for(file_path)
+    if os.path.exists(thumb_path) and os.path.getmtime(thumb_path) >= os.path.getmtime(file_path):
+        return thumb_path, 0.0
+    
+    with Image.open(file_path) as image:
+        _shrink_image(image, size)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # 透明背景铺白色
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        temp_path = thumb_path + '.part'
+        image.save(temp_path, 'JPEG', quality=85)
+    os.replace(temp_path, thumb_path)
+    return thumb_path, time.perf_counter() - started
+
+
+def render_contact_sheet(entries, out_path, columns=6, cell_size=THUMBNAIL_SIZE):
+    """把一页缩略图拼成联系表，entries为 [(缩略图路径, 标签)]，返回输出路径"""
+    label_height = 20
+    cell_width, cell_height = cell_size
+    rows = (len(entries) + columns - 1) // columns
+    sheet = Image.new('RGB', (columns * cell_width, rows * (cell_height + label_height)), (255, 255, 255))
+    draw = ImageDraw.Draw(sheet)
+    
+    for i, (thumb_path, label) in enumerate(entries):
+        left = (i % columns) * cell_width
+        top = (i // columns) * (cell_height + label_height)
+        with Image.open(thumb_path) as thumb:
+            # 缩略图在格子内居中
+            sheet.paste(thumb, (left + (cell_width - thumb.width) // 2, top + (cell_height - thumb.height) // 2))
+        draw.text((left + 4, top + cell_height + 4), label, fill=(0, 0, 0))
+    
+    temp_path = out_path + '.part'
+    sheet.save(temp_path, 'JPEG', quality=85)
+    os.replace(temp_path, out_path)
+    return out_path
+
+
+class ThumbnailCache:
+    """已解码预览缩略图的LRU缓存（线程安全）"""
+    
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+class ThumbnailGenerator:
+    """下载完成后批量生成缩略图和分页联系表
+    
+    解码和缩放是CPU密集型操作，在ProcessPoolExecutor中执行以利用全部CPU核心。
+    已经在守护进程中（如批量模式的工作进程）时不能再创建子进程，改用线程池。
+    """
+    
+    def __init__(self, max_workers=None, size=THUMBNAIL_SIZE, sheet_columns=6, sheet_rows=5):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.size = size
+        self.sheet_columns = sheet_columns
+        self.sheet_rows = sheet_rows
+        self.timings = []
+        self.errors = 0
+        self.sheets = []
+        self.elapsed = 0.0
+    
+    def _executor(self):
+        if multiprocessing.current_process().daemon:
+            return ThreadPoolExecutor(max_workers=self.max_workers)
+        return ProcessPoolExecutor(max_workers=self.max_workers)
+    
+    def run(self, files, save_dir, progress_callback=None):
+        """为 files（[(序号, 文件路径)]）生成缩略图和联系表，返回 {序号: 缩略图路径}
+        
+        progress_callback(event) 的 event['status'] 取值为 thumbnail / thumbnail_failed / contact_sheet，
+        thumbnail 事件带有该图片的耗时 elapsed（秒）。
+        """
+        started = time.perf_counter()
+        self.timings = []
+        self.errors = 0
+        self.sheets = []
+        
+        # 去重后多个序号可能指向同一个文件，只处理一次
+        indexes_by_path = {}
+        for index, file_path in files:
+            indexes_by_path.setdefault(file_path, []).append(index)
+        
+        thumbnails = {}
+        with self._executor() as executor:
+            futures = {executor.submit(make_file_thumbnail, file_path, self.size): file_path
+                       for file_path in indexes_by_path}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                indexes = indexes_by_path[file_path]
+                try:
+                    thumb_path, elapsed = future.result()
+                except Exception as e:
+                    self.errors += 1
+                    if progress_callback:
+                        progress_callback({'status': 'thumbnail_failed', 'index': indexes[0],
+                                           'file_path': file_path, 'error': str(e)})
+                    continue
+                
+                self.timings.append(elapsed)
+                for index in indexes:
+                    thumbnails[index] = thumb_path
+                if progress_callback:
+                    progress_callback({'status': 'thumbnail', 'index': indexes[0], 'file_path': file_path,
+                                       'thumbnail': thumb_path, 'elapsed': elapsed})
+            
+            # 按序号分页生成联系表，每页一个任务
+            ordered = []
+            for file_path, indexes in indexes_by_path.items():
+                index = min(indexes)
+                if index in thumbnails:
+                    ordered.append((index, file_path, thumbnails[index]))
+            ordered.sort()
+            per_page = self.sheet_columns * self.sheet_rows
+            pages = [ordered[i:i + per_page] for i in range(0, len(ordered), per_page)]
+            sheet_futures = [
+                executor.submit(render_contact_sheet,
+                                [(thumb, os.path.basename(path)) for _, path, thumb in page],
+                                os.path.join(save_dir, f"contact_sheet_{page_number:03d}.jpg"),
+                                self.sheet_columns, self.size)
+                for page_number, page in enumerate(pages, 1)
+            ]
+            for page_number, future in enumerate(sheet_futures, 1):
+                try:
+                    sheet_path = future.result()
+                except Exception as e:
+                    logger.warning(f"✗ 生成联系表失败: {e}")
+                    continue
+                self.sheets.append(sheet_path)
+                if progress_callback:
+                    progress_callback({'status': 'contact_sheet', 'page': page_number,
+                                       'pages': len(pages), 'file_path': sheet_path})
+        
+        self.elapsed = time.perf_counter() - started
+        return thumbnails
+    
+    def summary(self):
+        """返回可序列化为JSON的统计信息"""
+        timings = self.timings
+        return {
+            'thumbnails': len(timings),
+            'errors': self.errors,
+            'contact_sheets': len(self.sheets),
+            'workers': self.max_workers,
+            'elapsed': round(self.elapsed, 3),
+            'avg_ms': round(sum(timings) * 1000 / len(timings), 1) if timings else 0.0,
+            'max_ms': round(max(timings) * 1000, 1) if timings else 0.0,
+        }
+    
+    def describe(self):
+        """返回可读的统计说明"""
+        info = self.summary()
+        if not info['thumbnails'] and not info['errors']:
+            return ""
+        return (f"缩略图 {info['thumbnails']} 张（失败 {info['errors']}），联系表 {info['contact_sheets']} 页，"
+                f"单张平均 {info['avg_ms']}ms / 最长 {info['max_ms']}ms，"
+                f"并行 {info['workers']} 路共用时 {info['elapsed']}s")
+
+
 class SeleniumSnifferGUI:
     """Selenium嗅探器的GUI界面"""
     
+    # 每次root.after回调最多插入的行数，避免大量结果时界面卡顿
+    INSERT_BATCH = 200
+    ALL_TYPES = '全部'
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("高级图片嗅探工具 - Selenium版")
         self.root.geometry("1000x700")
         
-        self.sniffer = SeleniumImageSniffer()
+        self.sniffer = SeleniumImageSniffer(cache=DiskCache())
+        # 单个浏览器的驱动池：重复嗅探时复用同一个浏览器，启动时在后台预热
+        self.driver_pool = DriverPool(self.sniffer._launch_driver, size=1)
+        self.sniffer.driver_pool = self.driver_pool
         self.images = []
+        # 列表行id到图片信息的映射（行id即图片序号），以及当前的行顺序
+        self.row_images = {}
+        self.row_order = []
+        self.sort_column = None
+        self.sort_reverse = False
         self.current_preview = None
+        # 嗅探线程把结果放入队列，由主线程通过root.after定时取出并显示
+        self.result_queue = queue.Queue()
+        # 预览在后台线程中下载和解码，缩略图缓存在内存中
+        self.preview_executor = ThreadPoolExecutor(max_workers=2)
+        self.thumbnail_cache = ThumbnailCache()
+        self._pending_previews = {}
+        self._preview_lock = threading.Lock()
         
         self.setup_ui()
+        
+        # 按界面默认选项预热浏览器
+        self.driver_pool.warm(self.sniffer._driver_key(
+            self.headless_var.get(), self.capture_network_var.get() or self.reuse_bodies_var.get()))
     
     def setup_ui(self):
         """设置用户界面"""
@@ -486,10 +3216,36 @@ class SeleniumSnifferGUI:
         self.min_size_var = tk.StringVar(value="10")
         ttk.Entry(params_frame, textvariable=self.min_size_var, width=10).grid(row=0, column=1, padx=(0, 20))
         
+        ttk.Label(params_frame, text="最小宽度(px):").grid(row=1, column=0, padx=(0, 5), pady=(5, 0))
+        self.min_width_var = tk.StringVar(value="0")
+        ttk.Entry(params_frame, textvariable=self.min_width_var, width=10).grid(row=1, column=1, padx=(0, 20), pady=(5, 0))
+        
+        ttk.Label(params_frame, text="最小高度(px):").grid(row=1, column=2, padx=(0, 5), pady=(5, 0))
+        self.min_height_var = tk.StringVar(value="0")
+        ttk.Entry(params_frame, textvariable=self.min_height_var, width=10).grid(row=1, column=3, padx=(0, 20), pady=(5, 0))
+        
+        self.dedup_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(params_frame, text="下载去重", variable=self.dedup_var).grid(row=1, column=4, padx=(0, 20), pady=(5, 0))
+        
+        self.phash_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(params_frame, text="相似图片去重", variable=self.phash_var).grid(row=1, column=5, padx=(0, 20), pady=(5, 0))
+        
+        self.thumbnails_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(params_frame, text="生成缩略图和联系表", variable=self.thumbnails_var).grid(row=1, column=6, padx=(0, 20), pady=(5, 0))
+        
         ttk.Label(params_frame, text="浏览器模式:").grid(row=0, column=2, padx=(0, 5))
         self.headless_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(params_frame, text="静默模式", variable=self.headless_var).grid(row=0, column=3, padx=(0, 20))
         
+        self.capture_network_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(params_frame, text="复用浏览器网络日志", variable=self.capture_network_var).grid(row=0, column=4, padx=(0, 20))
+        
+        self.reuse_bodies_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(params_frame, text="复用浏览器图片数据", variable=self.reuse_bodies_var).grid(row=0, column=5, padx=(0, 20))
+        
+        self.static_first_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(params_frame, text="优先静态抓取", variable=self.static_first_var).grid(row=0, column=6, padx=(0, 20))
+        
         # 按钮
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=3, column=0, columnspan=3, pady=10)
@@ -515,32 +3271,54 @@ class SeleniumSnifferGUI:
         result_frame = ttk.LabelFrame(main_frame, text="嗅探结果", padding="5")
         result_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
         result_frame.columnconfigure(0, weight=1)
-        result_frame.rowconfigure(0, weight=1)
+        result_frame.rowconfigure(1, weight=1)
         main_frame.rowconfigure(6, weight=1)
         
+        # 筛选条件（只隐藏/显示行，不重建列表）
+        filter_frame = ttk.Frame(result_frame)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 5))
+        
+        ttk.Label(filter_frame, text="类型:").grid(row=0, column=0, padx=(0, 5))
+        self.filter_type_var = tk.StringVar(value=self.ALL_TYPES)
+        self.filter_type_box = ttk.Combobox(filter_frame, textvariable=self.filter_type_var,
+                                            values=[self.ALL_TYPES], width=10, state='readonly')
+        self.filter_type_box.grid(row=0, column=1, padx=(0, 20))
+        self.filter_type_box.bind('<<ComboboxSelected>>', lambda e: self.apply_filter())
+        
+        ttk.Label(filter_frame, text="最小大小(KB):").grid(row=0, column=2, padx=(0, 5))
+        self.filter_size_var = tk.StringVar(value="0")
+        filter_size_entry = ttk.Entry(filter_frame, textvariable=self.filter_size_var, width=10)
+        filter_size_entry.grid(row=0, column=3, padx=(0, 20))
+        filter_size_entry.bind('<Return>', lambda e: self.apply_filter())
+        
+        ttk.Button(filter_frame, text="筛选", command=self.apply_filter).grid(row=0, column=4)
+        
         # 创建Treeview
-        columns = ('文件名', '大小', 'URL')
+        columns = ('文件名', '大小', '类型', 'URL')
         self.tree = ttk.Treeview(result_frame, columns=columns, show='headings', height=15)
         
-        # 设置列标题
-        self.tree.heading('文件名', text='文件名')
-        self.tree.heading('大小', text='大小(KB)')
+        # 设置列标题，点击标题排序
+        self.tree.heading('文件名', text='文件名', command=lambda: self.sort_results('文件名'))
+        self.tree.heading('大小', text='大小(KB)', command=lambda: self.sort_results('大小'))
+        self.tree.heading('类型', text='类型', command=lambda: self.sort_results('类型'))
         self.tree.heading('URL', text='URL')
         
         # 设置列宽
         self.tree.column('文件名', width=200)
         self.tree.column('大小', width=100)
+        self.tree.column('类型', width=80)
         self.tree.column('URL', width=400)
         
         # 滚动条
         scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.tree.yview)
         self.tree.configure(yscrollcommand=scrollbar.set)
         
-        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
         
-        # 双击预览
+        # 双击预览，选中行变化时预取相邻图片的缩略图
         self.tree.bind('<Double-1>', self.preview_image)
+        self.tree.bind('<<TreeviewSelect>>', self._prefetch_neighbours)
         
         # 保存目录
         # 保存目录
@@ -557,8 +3335,9 @@ class SeleniumSnifferGUI:
         """手动关闭浏览器"""
         try:
             self.sniffer.close()
+            self.driver_pool.shutdown()
             self.progress_var.set("浏览器已关闭")
-            messagebox.showinfo("提示", "浏览器已关闭。注意：关闭浏览器后将无法下载图片，需要重新嗅探。")
+            messagebox.showinfo("提示", "浏览器已关闭。下载将使用嗅探时保存的cookies，如遇失败请重新嗅探。")
         except Exception as e:
             messagebox.showerror("错误", f"关闭浏览器失败: {e}")
     
@@ -574,10 +3353,20 @@ class SeleniumSnifferGUI:
         except ValueError:
             min_size = 10
         
-        # 清空结果
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        try:
+            min_width = int(self.min_width_var.get())
+            min_height = int(self.min_height_var.get())
+        except ValueError:
+            min_width = min_height = 0
+        
+        # 清空结果（包括被筛选隐藏的行）
+        if self.row_images:
+            self.tree.delete(*self.row_images)
         self.images = []
+        self.row_images = {}
+        self.row_order = []
+        self.filter_type_box.config(values=[self.ALL_TYPES])
+        self.filter_type_var.set(self.ALL_TYPES)
         self.download_all_btn.config(state='disabled')
         
         # 禁用按钮并开始进度条
@@ -585,51 +3374,166 @@ class SeleniumSnifferGUI:
         self.progress_bar.start()
         
         # 在新线程中执行嗅探
+        self.result_queue = queue.Queue()
         threading.Thread(
             target=self._sniff_thread,
-            args=(url, min_size, self.headless_var.get()),
+            args=(url, min_size, self.headless_var.get(), self.capture_network_var.get(),
+                  self.reuse_bodies_var.get(), min_width, min_height,
+                  'auto' if self.static_first_var.get() else 'browser'),
             daemon=True
         ).start()
+        self.root.after(100, self._drain_results)
     
-    def _sniff_thread(self, url, min_size, headless):
+    def _sniff_thread(self, url, min_size, headless, capture_network=False, reuse_bodies=False,
+                      min_width=0, min_height=0, fetch_mode='browser'):
         """嗅探线程"""
         try:
-            self.progress_var.set("正在启动浏览器...")
-            
-            # 创建浏览器驱动
-            if not self.sniffer.create_driver(headless):
-                raise Exception("无法启动浏览器，请确保已安装Chrome和ChromeDriver")
+            # 网络日志需要在创建浏览器时开启
+            self.sniffer.capture_network = capture_network
+            self.sniffer.reuse_browser_bodies = reuse_bodies
+            self.sniffer.fetch_mode = fetch_mode
+            # 每次嗅探重新统计指标（之后的下载也计入本次嗅探）
+            self.sniffer.metrics.reset()
+            
+            if fetch_mode == 'browser':
+                self.progress_var.set("正在启动浏览器...")
+                
+                # 创建浏览器驱动
+                if not self.sniffer.create_driver(headless):
+                    raise Exception("无法启动浏览器，请确保已安装Chrome和ChromeDriver")
+            else:
+                # 需要时再按当前设置从驱动池中取出浏览器
+                self.sniffer.close()
+                self.sniffer.headless = headless
             
             self.progress_var.set("正在嗅探图片...")
             
-            # 执行嗅探
-            images = self.sniffer.extract_images_from_page(url, min_size)
+            # 执行嗅探，每张图片验证通过后立即交给界面显示
+            found = 0
+            for img_info in self.sniffer.iter_images_from_page(url, min_size, min_width, min_height):
+                found += 1
+                self.result_queue.put(('image', img_info))
             
-            # 更新UI
-            self.root.after(0, self._sniff_completed, images)
+            # 没有任何结果时显示失败原因（如浏览器无法启动）
+            if self.sniffer.last_error and not found:
+                raise Exception(self.sniffer.last_error)
+            self.result_queue.put(('done', None))
             
         except Exception as e:
-            self.root.after(0, self._sniff_failed, str(e))
+            self.result_queue.put(('error', str(e)))
         # 注意：不在这里关闭浏览器，保持连接用于下载
     
-    def _sniff_completed(self, images):
+    def _drain_results(self):
+        """在主线程中取出嗅探结果并分批插入列表，直到嗅探结束"""
+        for _ in range(self.INSERT_BATCH):
+            try:
+                kind, payload = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            if kind == 'image':
+                self._add_result_row(payload)
+            elif kind == 'done':
+                self._sniff_completed()
+                return
+            else:
+                self._sniff_failed(payload)
+                return
+        else:
+            # 本批已满，队列中可能还有结果，尽快继续
+            self.progress_var.set(f"正在嗅探图片... 已找到 {len(self.images)} 张")
+            self.root.after(1, self._drain_results)
+            return
+        
+        self.progress_var.set(f"正在嗅探图片... 已找到 {len(self.images)} 张")
+        self.root.after(100, self._drain_results)
+    
+    @staticmethod
+    def _image_type(img_info):
+        """图片类型，用于显示、排序和筛选"""
+        content_type = (img_info.get('content_type') or '').split(';')[0].strip()
+        if content_type.startswith('image/'):
+            return content_type[6:]
+        ext = os.path.splitext(img_info['filename'])[1].lstrip('.').lower()
+        return ext or '未知'
+    
+    def _add_result_row(self, img_info):
+        """添加一行结果，不符合当前筛选条件的行插入后立即隐藏"""
+        self.images.append(img_info)
+        iid = str(len(self.images))
+        self.row_images[iid] = img_info
+        self.row_order.append(iid)
+        
+        img_type = self._image_type(img_info)
+        self.tree.insert('', 'end', iid=iid, values=(
+            img_info['filename'],
+            f"{img_info['size']/1024:.1f}",
+            img_type,
+            img_info['url'][:80] + '...' if len(img_info['url']) > 80 else img_info['url']
+        ))
+        
+        types = self.filter_type_box.cget('values')
+        if img_type not in types:
+            self.filter_type_box.config(values=tuple(types) + (img_type,))
+        
+        if not self._row_visible(img_info, *self._filter_params()):
+            self.tree.detach(iid)
+    
+    def _filter_params(self):
+        """读取筛选条件，返回(类型, 最小字节数)"""
+        try:
+            min_bytes = float(self.filter_size_var.get() or 0) * 1024
+        except ValueError:
+            min_bytes = 0
+        return self.filter_type_var.get(), min_bytes
+    
+    def _row_visible(self, img_info, img_type, min_bytes):
+        """判断一行是否符合筛选条件"""
+        if img_type != self.ALL_TYPES and self._image_type(img_info) != img_type:
+            return False
+        return img_info['size'] >= min_bytes
+    
+    def apply_filter(self):
+        """按类型和大小筛选结果：隐藏不符合的行，按当前顺序重新挂回符合的行"""
+        img_type, min_bytes = self._filter_params()
+        position = 0
+        for iid in self.row_order:
+            if self._row_visible(self.row_images[iid], img_type, min_bytes):
+                self.tree.move(iid, '', position)
+                position += 1
+            else:
+                self.tree.detach(iid)
+        
+        if self.images:
+            self.progress_var.set(f"显示 {position} / {len(self.images)} 张图片")
+    
+    def sort_results(self, column):
+        """按列排序，再次点击同一列时反向排序"""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        
+        if column == '大小':
+            key = lambda iid: self.row_images[iid]['size']
+        elif column == '类型':
+            key = lambda iid: (self._image_type(self.row_images[iid]), int(iid))
+        else:
+            key = lambda iid: self.row_images[iid]['filename'].lower()
+        
+        self.row_order.sort(key=key, reverse=self.sort_reverse)
+        self.apply_filter()
+    
+    def _sniff_completed(self):
         """嗅探完成"""
         self.progress_bar.stop()
         self.sniff_btn.config(state='normal')
         
-        self.images = images
+        images = self.images
         
         if images:
             self.download_all_btn.config(state='normal')
-            
-            # 显示结果
-            for img in images:
-                self.tree.insert('', 'end', values=(
-                    img['filename'],
-                    f"{img['size']/1024:.1f}",
-                    img['url'][:80] + '...' if len(img['url']) > 80 else img['url']
-                ))
-            
             self.progress_var.set(f"嗅探完成，找到 {len(images)} 张图片")
         else:
             self.progress_var.set("未找到符合条件的图片")
@@ -647,72 +3551,113 @@ class SeleniumSnifferGUI:
         if not selection:
             return
         
-        item = self.tree.item(selection[0])
-        filename = item['values'][0]
-        
-        # 找到对应的图片信息
-        img_info = None
-        for img in self.images:
-            if img['filename'] == filename:
-                img_info = img
-                break
-        
+        img_info = self.row_images.get(selection[0])
         if not img_info:
             return
         
         # 创建预览窗口
-        self.show_preview_window(img_info)
+        self.show_preview_window(img_info, int(selection[0]))
+    
+    def _load_thumbnail(self, img_info):
+        """后台线程：获取图片数据并解码为缩略图"""
+        url = img_info['url']
+        cached = self.thumbnail_cache.get(url)
+        if cached is not None:
+            return cached
+        
+        try:
+            # 获取图片数据用于预览（优先使用浏览器已下载的数据和磁盘缓存）
+            data = self.sniffer.fetch_image_bytes(url)
+            result = make_preview_thumbnail(data)
+            self.thumbnail_cache.put(url, result)
+            return result
+        finally:
+            with self._preview_lock:
+                self._pending_previews.pop(url, None)
+    
+    def _request_thumbnail(self, img_info):
+        """提交缩略图加载任务，同一张图片正在加载时复用已有任务"""
+        url = img_info['url']
+        with self._preview_lock:
+            future = self._pending_previews.get(url)
+            if future is None:
+                future = self.preview_executor.submit(self._load_thumbnail, img_info)
+                if not future.done():
+                    self._pending_previews[url] = future
+        return future
+    
+    def _prefetch_neighbours(self, event=None, radius=2):
+        """预取选中行前后几行的缩略图"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        
+        # 只预取当前可见（未被筛选隐藏）的相邻行
+        neighbours = [selection[0]]
+        prev_iid = next_iid = selection[0]
+        for _ in range(radius):
+            prev_iid = prev_iid and self.tree.prev(prev_iid)
+            next_iid = next_iid and self.tree.next(next_iid)
+            neighbours.extend(iid for iid in (prev_iid, next_iid) if iid)
+        
+        for iid in neighbours:
+            img_info = self.row_images.get(iid)
+            if img_info and self.thumbnail_cache.get(img_info['url']) is None:
+                self._request_thumbnail(img_info)
     
-    def show_preview_window(self, img_info):
-        """显示预览窗口"""
+    def show_preview_window(self, img_info, index=None):
+        """显示预览窗口（图片在后台加载，不阻塞界面）"""
         preview_window = tk.Toplevel(self.root)
         preview_window.title(f"预览 - {img_info['filename']}")
         preview_window.geometry("600x500")
         
+        img_label = ttk.Label(preview_window, text="正在加载预览...")
+        img_label.pack(pady=10)
+        
+        # 显示信息
+        info_var = tk.StringVar(value=f"文件名: {img_info['filename']}\n大小: {img_info['size']/1024:.1f} KB\nURL: {img_info['url']}")
+        ttk.Label(preview_window, textvariable=info_var, wraplength=550).pack(pady=10)
+        
+        # 下载按钮
+        ttk.Button(preview_window, text="下载这张图片", 
+                  command=lambda: self.download_single(img_info, index)).pack(pady=10)
+        
+        cached = self.thumbnail_cache.get(img_info['url'])
+        if cached is not None:
+            self._show_thumbnail(preview_window, img_label, info_var, img_info, cached)
+            return
+        
+        future = self._request_thumbnail(img_info)
+        future.add_done_callback(
+            lambda f: self.root.after(0, self._preview_loaded, preview_window, img_label, info_var, img_info, f)
+        )
+    
+    def _preview_loaded(self, preview_window, img_label, info_var, img_info, future):
+        """主线程：缩略图加载完成后更新预览窗口"""
+        if not preview_window.winfo_exists():
+            return
         try:
-            # 下载图片数据用于预览
-            cookies = self.sniffer.driver.get_cookies() if self.sniffer.driver else []
-            cookie_dict = {cookie['name']: cookie['value'] for cookie in cookies}
-            
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = self.sniffer.session.get(img_info['url'], headers=headers, cookies=cookie_dict, timeout=10)
-            
-            # 创建PIL图像
-            pil_image = Image.open(io.BytesIO(response.content))
-            
-            # 调整图像大小以适应窗口
-            pil_image.thumbnail((550, 400), Image.Resampling.LANCZOS)
-            
-            # 转换为Tkinter可用的格式
-            photo = ImageTk.PhotoImage(pil_image)
-            
-            # 显示图像
-            img_label = ttk.Label(preview_window, image=photo)
-            img_label.image = photo  # 保持引用
-            img_label.pack(pady=10)
-            
-            # 显示信息
-            info_text = f"文件名: {img_info['filename']}\n大小: {img_info['size']/1024:.1f} KB\nURL: {img_info['url']}"
-            ttk.Label(preview_window, text=info_text, wraplength=550).pack(pady=10)
-            
-            # 下载按钮
-            ttk.Button(preview_window, text="下载这张图片", 
-                      command=lambda: self.download_single(img_info)).pack(pady=10)
-            
+            self._show_thumbnail(preview_window, img_label, info_var, img_info, future.result())
         except Exception as e:
-            ttk.Label(preview_window, text=f"预览失败: {e}").pack(pady=20)
+            img_label.config(text=f"预览失败: {e}")
+    
+    def _show_thumbnail(self, preview_window, img_label, info_var, img_info, thumbnail):
+        """把缩略图显示到预览窗口"""
+        pil_image, pil_size = thumbnail
+        
+        # 转换为Tkinter可用的格式
+        photo = ImageTk.PhotoImage(pil_image)
+        img_label.config(image=photo, text='')
+        img_label.image = photo  # 保持引用
+        
+        info_var.set(f"文件名: {img_info['filename']}\n大小: {img_info['size']/1024:.1f} KB\n"
+                     f"尺寸: {pil_size[0]}x{pil_size[1]}\nURL: {img_info['url']}")
     
-    def download_single(self, img_info):
-        """下载单张图片"""
+    def download_single(self, img_info, index=None):
+        """下载单张图片（index为图片序号，用于按顺序命名）"""
         try:
-            # 找到图片在列表中的索引，用于按顺序命名
-            index = None
-            for i, img in enumerate(self.images, 1):
-                if img['url'] == img_info['url']:
-                    index = i
-                    break
-            
-            file_path = self.sniffer.download_image(img_info, self.save_dir, index)
+            file_path = self.sniffer.download_image(img_info, self.save_dir, index,
+                                                    manifest=DownloadManifest(self.save_dir))
             messagebox.showinfo("下载成功", f"图片已保存到: {file_path}")
         except Exception as e:
             messagebox.showerror("下载失败", str(e))
@@ -725,38 +3670,77 @@ class SeleniumSnifferGUI:
         self.download_all_btn.config(state='disabled')
         self.progress_bar.start()
         
-        threading.Thread(target=self._download_all_thread, daemon=True).start()
+        deduplicator = None
+        if self.dedup_var.get() or self.phash_var.get():
+            deduplicator = Deduplicator(perceptual=self.phash_var.get())
+        thumbnailer = ThumbnailGenerator() if self.thumbnails_var.get() else None
+        
+        threading.Thread(target=self._download_all_thread, args=(deduplicator, thumbnailer), daemon=True).start()
     
-    def _download_all_thread(self):
+    def _download_all_thread(self, deduplicator=None, thumbnailer=None):
         """批量下载线程"""
-        success_count = 0
         total_count = len(self.images)
         
-        for i, img_info in enumerate(self.images):
-            try:
-                # 按顺序重命名：001.jpg, 002.png 等
-                index = i + 1
-                self.root.after(0, lambda idx=index, total=total_count, name=img_info['filename']: 
-                               self.progress_var.set(f"正在下载 {idx}/{total}: {name}"))
-                
-                file_path = self.sniffer.download_image(img_info, self.save_dir, index)
-                success_count += 1
-                print(f"✓ 下载成功: {file_path}")
-                
-            except Exception as e:
-                print(f"✗ 下载失败 {img_info['filename']}: {e}")
+        # 浏览器仍在运行时检查上下文是否需要刷新，否则沿用最后一次快照
+        self.sniffer.refresh_context()
+        
+        finished = [0]
+        finished_lock = threading.Lock()
+        
+        def on_progress(event):
+            status = event['status']
+            if status in ('done', 'failed'):
+                with finished_lock:
+                    finished[0] += 1
+                    done = finished[0]
+                if status == 'done':
+                    logger.info(f"✓ 下载成功: {event['file_path']}")
+                else:
+                    logger.warning(f"✗ 下载失败 {event['filename']}: {event['error']}")
+                self.root.after(0, lambda d=done, name=event['filename']:
+                               self.progress_var.set(f"已完成 {d}/{total_count}: {name}"))
+            elif status == 'progress' and event['total_bytes']:
+                percent = event['bytes'] * 100 // event['total_bytes']
+                self.root.after(0, lambda idx=event['index'], name=event['filename'], p=percent:
+                               self.progress_var.set(f"正在下载 {idx}/{total_count}: {name} ({p}%)"))
+            elif status == 'thumbnail':
+                logger.info(f"✓ 缩略图: {event['thumbnail']} ({event['elapsed'] * 1000:.0f}ms)")
+                self.root.after(0, lambda path=event['thumbnail']:
+                               self.progress_var.set(f"正在生成缩略图: {os.path.basename(path)}"))
+            elif status == 'thumbnail_failed':
+                logger.warning(f"✗ 缩略图生成失败 {event['file_path']}: {event['error']}")
+            elif status == 'contact_sheet':
+                logger.info(f"✓ 联系表 {event['page']}/{event['pages']}: {event['file_path']}")
+        
+        # 按顺序重命名：001.jpg, 002.png 等
+        downloader = BatchDownloader(self.sniffer, max_workers=self.sniffer.max_workers,
+                                     per_host_limit=self.sniffer.per_host_limit,
+                                     deduplicator=deduplicator, thumbnailer=thumbnailer)
+        results = downloader.download_all(self.images, self.save_dir, on_progress)
+        success_count = sum(1 for result in results if result['file_path'])
+        if self.sniffer.cache:
+            logger.info(f"缓存统计: {self.sniffer.cache.summary()}")
+        
+        dedup_text = deduplicator.describe() if deduplicator else ""
+        if dedup_text:
+            logger.info(dedup_text)
+        if thumbnailer and thumbnailer.describe():
+            logger.info(thumbnailer.describe())
+            dedup_text = "，".join(text for text in (dedup_text, thumbnailer.describe()) if text)
         
         # 更新UI
-        self.root.after(0, self._download_completed, success_count, total_count)
+        self.root.after(0, self._download_completed, success_count, total_count, dedup_text)
     
-    def _download_completed(self, success_count, total_count):
+    def _download_completed(self, success_count, total_count, dedup_text=""):
         """下载完成"""
         self.progress_bar.stop()
         self.download_all_btn.config(state='normal')
-        self.progress_var.set(f"下载完成: {success_count}/{total_count} 张图片成功")
+        self.progress_var.set(f"下载完成: {success_count}/{total_count} 张图片成功" +
+                              (f"，{dedup_text}" if dedup_text else ""))
         
         messagebox.showinfo("下载完成", 
                            f"共 {total_count} 张图片，成功下载 {success_count} 张\n"
+                           + (f"{dedup_text}\n" if dedup_text else "") +
                            f"保存位置: {self.save_dir}")
     
     def run(self):
@@ -766,10 +3750,188 @@ class SeleniumSnifferGUI:
     
     def on_closing(self):
         """关闭程序时的清理工作"""
+        self.preview_executor.shutdown(wait=False, cancel_futures=True)
         self.sniffer.close()
+        self.driver_pool.shutdown()
         self.root.destroy()
 
 
+# 批量模式下每个工作进程各自持有的嗅探器
+_batch_sniffer = None
+_batch_options = None
+
+
+def url_to_dirname(url):
+    """把URL转换为可用作目录名的字符串（主机名+路径，附带短哈希避免重名）"""
+    parsed = urlparse(url)
+    path = re.sub(r'[^0-9A-Za-z._-]+', '_', parsed.path.strip('/'))[:60].strip('_')
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+    return '_'.join(part for part in (parsed.netloc.replace(':', '_'), path, digest) if part)
+
+
+def _batch_worker_init(options):
+    """工作进程初始化：创建独立的嗅探器和单浏览器驱动池"""
+    import sys
+    global _batch_sniffer, _batch_options
+    
+    # 标准输出留给JSONL结果，工作进程的日志改为输出到标准错误
+    sys.stdout = sys.stderr
+    setup_logging()
+    
+    _batch_options = options
+    _batch_sniffer = SeleniumImageSniffer(
+        max_workers=options['threads'],
+        cache=DiskCache() if options['cache'] else None,
+        fetch_mode=options['fetch'],
+        lean_profile=options['lean'],
+        block_images=options['block_images'],
+    )
+    _batch_sniffer.driver_pool = DriverPool(_batch_sniffer._launch_driver, size=1,
+                                            max_pages=options['max_pages'])
+    Finalize(None, _batch_worker_shutdown, exitpriority=10)
+
+
+def _batch_worker_shutdown():
+    """工作进程退出时关闭浏览器并保存缓存索引"""
+    if _batch_sniffer:
+        _batch_sniffer.close()
+        _batch_sniffer.driver_pool.shutdown()
+
+
+def _batch_worker_run(url):
+    """在工作进程中嗅探一个URL，返回可序列化为JSON的结果"""
+    options = _batch_options
+    started = time.time()
+    record = {'url': url, 'ok': False, 'error': None, 'images': []}
+    _batch_sniffer.metrics.reset()
+    
+    try:
+        # 浏览器在需要时才启动（静态抓取成功的页面不启动浏览器）
+        images = _batch_sniffer.extract_images_from_page(
+            url, options['min_size'], options['min_width'], options['min_height']
+        )
+        record['images'] = images
+        if _batch_sniffer.last_error and not images:
+            raise Exception(_batch_sniffer.last_error)
+        record['ok'] = True
+        
+        if options['download'] and images:
+            save_dir = os.path.join(options['save_dir'], url_to_dirname(url))
+            deduplicator = Deduplicator(perceptual=options['phash'])
+            thumbnailer = ThumbnailGenerator(max_workers=options['threads']) if options['thumbnails'] else None
+            downloader = BatchDownloader(_batch_sniffer, max_workers=options['threads'],
+                                         deduplicator=deduplicator, thumbnailer=thumbnailer)
+            results = downloader.download_all(images, save_dir)
+            record['save_dir'] = save_dir
+            record['dedup'] = deduplicator.summary()
+            if thumbnailer:
+                record['thumbnails'] = thumbnailer.summary()
+                record['contact_sheets'] = thumbnailer.sheets
+            record['downloaded'] = sum(1 for result in results if result['file_path'])
+            record['files'] = [result['file_path'] for result in results]
+    except Exception as e:
+        record['error'] = str(e)
+    finally:
+        # 归还浏览器，驱动池会清理cookies和标签页供下一个URL使用
+        _batch_sniffer.close()
+    
+    record['elapsed'] = round(time.time() - started, 3)
+    if options['profile']:
+        record['metrics'] = dict(_batch_sniffer.metrics.summary(), hosts=_batch_sniffer.host_stats())
+    return record
+
+
+def read_url_list(source):
+    """读取URL列表，source为文件路径或"-"（标准输入），忽略空行和#注释"""
+    import sys
+    
+    if source == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+def run_batch(argv):
+    """批量模式：多进程并行嗅探多个URL，每个页面的结果输出一行JSON"""
+    import sys
+    
+    parser = argparse.ArgumentParser(prog='selenium_sniffer.py --batch', description='批量嗅探多个网页')
+    parser.add_argument('input', help='URL列表文件，每行一个URL；"-"表示从标准输入读取')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 2, help='工作进程数（默认CPU核数）')
+    parser.add_argument('-o', '--output', default='-', help='JSONL输出文件（默认标准输出）')
+    parser.add_argument('--min-size', type=int, default=10, help='最小图片大小(KB)')
+    parser.add_argument('--min-width', type=int, default=0, help='最小宽度(px)')
+    parser.add_argument('--min-height', type=int, default=0, help='最小高度(px)')
+    parser.add_argument('--download', action='store_true', help='自动下载，每个URL保存到单独的子目录')
+    parser.add_argument('--phash', action='store_true', help='下载时合并视觉上相同的图片，只保留最大的版本')
+    parser.add_argument('--thumbnails', action='store_true', help='下载后生成缩略图（001_thumb.jpg）和分页联系表')
+    parser.add_argument('--save-dir', default=os.path.join(os.path.expanduser('~'), 'Downloads', 'ImageSniffer'),
+                        help='下载根目录')
+    parser.add_argument('--threads', type=int, default=8, help='每个进程内的验证/下载线程数')
+    parser.add_argument('--max-pages', type=int, default=50, help='每个浏览器访问多少个页面后重启')
+    parser.add_argument('--no-cache', action='store_true', help='不使用磁盘缓存')
+    parser.add_argument('--profile', action='store_true', help='在每行结果中附带各阶段耗时和请求统计（metrics字段）')
+    parser.add_argument('--fetch', choices=('browser', 'auto', 'static'), default='browser',
+                        help='页面获取方式：browser只用浏览器；auto先直接请求HTML，失败时用浏览器；static只解析HTML')
+    parser.add_argument('--full-load', action='store_true',
+                        help='关闭精简加载：等待页面完全加载，不屏蔽字体、音视频和统计/广告请求')
+    parser.add_argument('--block-images', action='store_true', help='浏览器中不加载图片内容（只从DOM收集图片URL）')
+    args = parser.parse_args(argv)
+    
+    urls = read_url_list(args.input)
+    if not urls:
+        print("❌ 没有可处理的URL", file=sys.stderr)
+        return 1
+    
+    options = {
+        'min_size': args.min_size,
+        'min_width': args.min_width,
+        'min_height': args.min_height,
+        'download': args.download,
+        'phash': args.phash,
+        'thumbnails': args.thumbnails,
+        'save_dir': args.save_dir,
+        'threads': max(1, args.threads),
+        'max_pages': args.max_pages,
+        'cache': not args.no_cache,
+        'profile': args.profile,
+        'fetch': args.fetch,
+        'lean': not args.full_load,
+        'block_images': args.block_images,
+    }
+    workers = max(1, min(args.workers, len(urls)))
+    
+    out = sys.stdout if args.output == '-' else open(args.output, 'a', encoding='utf-8')
+    pool = multiprocessing.Pool(processes=workers, initializer=_batch_worker_init, initargs=(options,))
+    started = time.time()
+    done = failed = 0
+    
+    try:
+        for record in pool.imap_unordered(_batch_worker_run, urls):
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            done += 1
+            if not record['ok']:
+                failed += 1
+            print(f"[{done}/{len(urls)}] {'✓' if record['ok'] else '✗'} {record['url']} "
+                  f"({len(record['images'])} 张图片, {record['elapsed']}s)", file=sys.stderr)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if out is not sys.stdout:
+            out.close()
+    
+    print(f"✅ 批量嗅探完成: {done - failed}/{len(urls)} 个页面成功，用时 {time.time() - started:.1f}s",
+          file=sys.stderr)
+    return 0 if not failed else 2
+
+
 def main():
     """主函数"""
     import sys
@@ -783,37 +3945,78 @@ def main():
         gui_available = False
         print("⚠️ GUI依赖不可用，只能使用命令行模式")
     
+    setup_logging()
+    
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        # 批量模式（非交互）
+        sys.exit(run_batch(sys.argv[2:]))
+    
     if len(sys.argv) > 1 and sys.argv[1] == '--cli':
         # 命令行模式
-        if len(sys.argv) < 3:
-            print("用法: python selenium_sniffer.py --cli <URL> [min_size_kb]")
+        argv = sys.argv[2:]
+        # --jsonl：每找到一张图片就向标准输出写一行JSON，日志改为输出到标准错误
+        jsonl = '--jsonl' in argv
+        # --phash：下载时按感知哈希合并视觉上相同的图片
+        phash = '--phash' in argv
+        # --thumbnails：下载后在进程池中生成缩略图和联系表
+        thumbnails = '--thumbnails' in argv
+        # --profile：结束时向标准错误输出一行JSON格式的指标汇总
+        profile = '--profile' in argv
+        # --static：先直接请求HTML解析，失败时再用浏览器；--static-only：只解析HTML
+        fetch_mode = 'static' if '--static-only' in argv else 'auto' if '--static' in argv else 'browser'
+        # --full-load：等待页面完全加载且不屏蔽任何请求；--block-images：浏览器中不加载图片内容
+        full_load = '--full-load' in argv
+        block_images = '--block-images' in argv
+        argv = [arg for arg in argv
+                if arg not in ('--jsonl', '--phash', '--thumbnails', '--profile', '--static', '--static-only',
+                               '--full-load', '--block-images')]
+        
+        if len(argv) < 1:
+            print("用法: python selenium_sniffer.py --cli <URL> [min_size_kb] [min_width] [min_height] "
+                  "[--jsonl] [--phash] [--thumbnails] [--profile] [--static | --static-only] "
+                  "[--full-load] [--block-images]")
             return
         
-        url = sys.argv[2]
-        min_size = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+        url = argv[0]
+        min_size = int(argv[1]) if len(argv) > 1 else 10
+        min_width = int(argv[2]) if len(argv) > 2 else 0
+        min_height = int(argv[3]) if len(argv) > 3 else 0
+        
+        out = sys.stdout
+        if jsonl:
+            sys.stdout = sys.stderr
         
-        sniffer = SeleniumImageSniffer()
+        sniffer = SeleniumImageSniffer(cache=DiskCache(), fetch_mode=fetch_mode,
+                                       lean_profile=not full_load, block_images=block_images)
         
         try:
-            print("正在启动浏览器...")
-            if not sniffer.create_driver(headless=True):
-                print("❌ 无法启动浏览器，请确保已安装Chrome和ChromeDriver")
-                return
-            
-            print("✅ 浏览器启动成功")
+            if fetch_mode == 'browser':
+                print("正在启动浏览器...")
+                if not sniffer.create_driver(headless=True):
+                    print("❌ 无法启动浏览器，请确保已安装Chrome和ChromeDriver")
+                    return
+                
+                print("✅ 浏览器启动成功")
             print(f"正在嗅探: {url}")
             
-            images = sniffer.extract_images_from_page(url, min_size)
-            
-            if images:
-                print(f"\n✅ 嗅探完成，找到 {len(images)} 张图片:")
-                print("-" * 80)
-                
-                for i, img in enumerate(images, 1):
+            # 每张图片验证通过后立即输出
+            images = []
+            for i, img in enumerate(sniffer.iter_images_from_page(url, min_size, min_width, min_height), 1):
+                images.append(img)
+                if jsonl:
+                    out.write(json.dumps(dict(img, index=i), ensure_ascii=False) + '\n')
+                    out.flush()
+                else:
                     print(f"{i:2d}. {img['filename']}")
                     print(f"    大小: {img['size']/1024:.1f} KB")
                     print(f"    URL: {img['url']}")
                     print()
+            
+            if images and jsonl:
+                print(f"✅ 嗅探完成，找到 {len(images)} 张图片")
+            elif images:
+                print(f"\n✅ 嗅探完成，找到 {len(images)} 张图片")
+                print("-" * 80)
                 
                 # 询问是否下载
                 choice = input("是否要下载所有图片? (y/n): ").lower().strip()
@@ -821,17 +4024,35 @@ def main():
                     save_dir = os.path.join(os.path.expanduser('~'), 'Downloads', 'ImageSniffer')
                     print(f"正在下载到: {save_dir}")
                     
-                    success = 0
-                    for i, img in enumerate(images, 1):
-                        try:
-                            print(f"下载 {i}/{len(images)}: {img['filename']}")
-                            sniffer.download_image(img, save_dir)
-                            success += 1
-                        except Exception as e:
-                            print(f"❌ 下载失败: {e}")
+                    def on_progress(event):
+                        if event['status'] == 'done':
+                            print(f"✓ {event['index']}/{event['total']}: {event['file_path']}")
+                        elif event['status'] == 'retry':
+                            print(f"↻ 重试 {event['index']}/{event['total']}: {event['error']}")
+                        elif event['status'] == 'failed':
+                            print(f"❌ 下载失败 {event['index']}/{event['total']}: {event['error']}")
+                        elif event['status'] == 'thumbnail':
+                            print(f"🖼 {event['thumbnail']} ({event['elapsed'] * 1000:.0f}ms)")
+                        elif event['status'] == 'thumbnail_failed':
+                            print(f"❌ 缩略图生成失败 {event['file_path']}: {event['error']}")
+                        elif event['status'] == 'contact_sheet':
+                            print(f"📄 联系表 {event['page']}/{event['pages']}: {event['file_path']}")
+                    
+                    deduplicator = Deduplicator(perceptual=phash)
+                    thumbnailer = ThumbnailGenerator() if thumbnails else None
+                    downloader = BatchDownloader(sniffer, deduplicator=deduplicator, thumbnailer=thumbnailer)
+                    results = downloader.download_all(images, save_dir, on_progress)
+                    success = sum(1 for result in results if result['file_path'])
                     
                     print(f"\n✅ 下载完成: {success}/{len(images)} 张图片成功")
+                    print(deduplicator.describe())
+                    if thumbnailer:
+                        print(thumbnailer.describe())
                     print(f"保存位置: {save_dir}")
+                    if sniffer.cache:
+                        print(f"缓存统计: {sniffer.cache.summary()}")
+            elif sniffer.last_error:
+                print(f"❌ 嗅探失败: {sniffer.last_error}")
             else:
                 print("❌ 未找到符合条件的图片")
                 
@@ -839,6 +4060,9 @@ def main():
             print(f"❌ 嗅探失败: {e}")
         finally:
             sniffer.close()
+            if profile:
+                sys.stderr.write(json.dumps(dict(sniffer.metrics.summary(), hosts=sniffer.host_stats()),
+                                            ensure_ascii=False) + '\n')
     else:
         # GUI模式
         if not gui_available:
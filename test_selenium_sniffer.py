@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+selenium_sniffer的单元测试（不需要浏览器的部分）
+
+运行: python -m pytest -q  或  python -m unittest test_selenium_sniffer
+"""
+
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from selenium_sniffer import HostScheduler, SeleniumImageSniffer, StaticImageParser, parse_srcset
+
+
+class HostSchedulerTest(unittest.TestCase):
+
+    def _request(self, scheduler, host, status=200, headers=None):
+        scheduler.acquire(host)
+        return scheduler.release(host, status, headers)
+    
+    def test_rate_recovers_after_transient_429(self):
+        scheduler = HostScheduler(max_concurrency=4, recover_after=10)
+        host = 'example.com'
+        for _ in range(30):
+            self._request(scheduler, host)
+        
+        self.assertTrue(self._request(scheduler, host, 429, {'Retry-After': '0'}))
+        rate = scheduler.stats()[host]['rate_limit']
+        # 按实际观测到的速率限速，不会因为观测窗口不足1秒而被压得很低
+        self.assertGreater(rate, 10)
+        
+        for _ in range(scheduler.recover_after):
+            self._request(scheduler, host)
+        self.assertIsNone(scheduler.stats()[host]['rate_limit'])
+    
+    def test_rate_grows_multiplicatively(self):
+        scheduler = HostScheduler(max_concurrency=4, rate_growth=0.5, recover_after=100)
+        host = 'example.com'
+        self._request(scheduler, host, 429, {'Retry-After': '0'})
+        rate = scheduler.stats()[host]['rate_limit']
+        
+        # 第二次请求按令牌桶等待，只验证速率按比例增长
+        scheduler._hosts[host]['tokens'] = 1.0
+        self._request(scheduler, host)
+        self.assertAlmostEqual(scheduler.stats()[host]['rate_limit'], round(rate * 1.5, 2), places=1)
+
+
+
+class SrcsetTest(unittest.TestCase):
+
+    def test_comma_without_space(self):
+        self.assertEqual(parse_srcset('a.jpg 1x,b.jpg 2x'), [('a.jpg', None, 1.0), ('b.jpg', None, 2.0)])
+        self.assertEqual(parse_srcset('a.jpg 300w,b.jpg 1200w'), [('a.jpg', 300, None), ('b.jpg', 1200, None)])
+    
+    def test_descriptors_and_whitespace(self):
+        self.assertEqual(parse_srcset(' a.jpg,  b.jpg 2x , c.jpg 640w 480h'),
+                         [('a.jpg', None, 1.0), ('b.jpg', None, 2.0), ('c.jpg', 640, None)])
+        self.assertEqual(parse_srcset(''), [])
+    
+    def test_static_parser_picks_largest_variant(self):
+        parser = StaticImageParser('https://example.com/')
+        parser.feed('<img src="/s.jpg" srcset="/s.jpg 300w,/l.jpg 1200w">')
+        sniffer = SeleniumImageSniffer()
+        self.assertEqual(sniffer._candidate_urls(parser.close()), ['https://example.com/l.jpg'])
+        self.assertEqual(sniffer.fallback_urls, {'https://example.com/l.jpg': ['https://example.com/s.jpg']})
+    
+    def test_harvest_expands_raw_srcset(self):
+        class HarvestDriver:
+            current_url = 'https://example.com/page'
+            
+            def execute_script(self, script, *args):
+                return [
+                    {'url': 'https://example.com/s.jpg', 'source': 'src', 'group': 1, 'w': None, 'x': None},
+                    {'srcset': 's.jpg 1x,l.jpg 2x', 'base': 'https://example.com/a/', 'source': 'srcset',
+                     'group': 1, 'w': None, 'x': None, 'rw': 300},
+                ]
+        
+        sniffer = SeleniumImageSniffer()
+        sniffer.driver = HarvestDriver()
+        candidates = sniffer.harvest_image_candidates()
+        self.assertEqual([(c['url'], c['x'], c.get('rw')) for c in candidates[1:]],
+                         [('https://example.com/a/s.jpg', 1.0, 300), ('https://example.com/a/l.jpg', 2.0, 300)])
+        self.assertEqual(sniffer._candidate_urls(candidates)[0], 'https://example.com/a/l.jpg')
+    
+    def test_src_ranked_by_natural_size(self):
+        dom = {'group': 1, 'rw': 300, 'complete': True, 'nw': 2400, 'nh': 1600,
+               'current': 'https://example.com/original.jpg'}
+        candidates = [
+            dict(dom, url='https://example.com/original.jpg', source='src', w=None, x=None),
+            dict(dom, url='https://example.com/small.jpg', source='srcset', w=600, x=None),
+            dict(dom, url='https://example.com/medium.jpg', source='srcset', w=1200, x=None),
+        ]
+        sniffer = SeleniumImageSniffer()
+        self.assertEqual(sniffer._candidate_urls(candidates), ['https://example.com/original.jpg'])
+        
+        # 自然尺寸属于其他URL（浏览器显示的不是src）时，src仍排在有描述符的候选之后
+        for candidate in candidates:
+            candidate['current'] = 'https://example.com/medium.jpg'
+            candidate['nw'] = 1200
+        self.assertEqual(sniffer._candidate_urls(candidates), ['https://example.com/medium.jpg'])
+
+
+LATE_STYLESHEET_PAGE = b"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"></head>
+<body>
+<div class="hero"><span class="inner"></span></div>
+<script>
+document.addEventListener('DOMContentLoaded', function () {
+    setTimeout(function () {
+        var link = document.createElement('link');
+        link.rel = 'stylesheet';
+        link.href = '/late.css';
+        document.head.appendChild(link);
+    }, 300);
+});
+</script>
+</body></html>"""
+
+LATE_STYLESHEET = b".hero .inner { display: block; width: 200px; height: 200px; background-image: url(/bg.jpg); }"
+
+
+class _LatePageHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/late.css':
+            body, content_type = LATE_STYLESHEET, 'text/css'
+        else:
+            body, content_type = LATE_STYLESHEET_PAGE, 'text/html; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class BackgroundCollectorTest(unittest.TestCase):
+    """需要本地Chrome，无法启动浏览器时跳过"""
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _LatePageHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.sniffer = SeleniumImageSniffer(scroll_time_budget=10)
+        if not self.sniffer.create_driver(headless=True):
+            self.server.shutdown()
+            self.skipTest("无法启动Chrome")
+    
+    def tearDown(self):
+        self.sniffer.close()
+        self.server.shutdown()
+    
+    def test_stylesheet_applied_after_interactive(self):
+        self.sniffer.driver.get(self.base_url + '/page.html')
+        self.assertTrue(self.sniffer.wait_for_page_load())
+        candidates = self.sniffer.harvest_image_candidates()
+        backgrounds = self.sniffer._background_urls + [
+            c['url'] for c in candidates if c['source'] == 'background']
+        self.assertIn(self.base_url + '/bg.jpg', backgrounds)
+
+
+if __name__ == '__main__':
+    unittest.main()